@@ -0,0 +1,396 @@
+"""Load and latency benchmark for every route of the tenders API.
+
+Seeds N tenders through the bulk endpoint, then drives concurrent load at
+each route and reports p50/p95/p99 latency, throughput and worker RSS as
+JSON that can be diffed across commits.
+
+By default the FastAPI app runs in-process against a throwaway database on
+the local mongod (MONGO_URL, default mongodb://localhost:27017); the
+database is dropped afterwards. ``--in-memory`` uses mongomock-motor instead
+when it is installed, and ``--base-url`` benchmarks an already running
+server (pass ``--server-pid`` to sample its RSS). With
+``STORAGE_BACKEND=embedded`` the in-process run measures the SQLite engine.
+
+    python bench_api.py --tenders 10000 --concurrency 16 --json --output bench.json
+
+The SSE feed and the admin routes are not load-tested: the first is a
+long-lived stream and the second depend on ADMIN_TOKEN and explain.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Union
+from urllib.parse import urlencode
+
+import typer
+
+BENCH_DB_NAME = "tenders_bench"
+SEED_CHUNK = 1000
+
+
+class InProcessClient:
+    """Calls the ASGI app directly, without sockets."""
+
+    def __init__(self, app):
+        from server import asgi_request
+
+        self.app = app
+        self.asgi_request = asgi_request
+
+    async def request(self, method: str, path: str, params: Optional[dict] = None,
+                      body: Union[dict, bytes, None] = None, headers: Optional[dict] = None):
+        # A dict is sent as JSON, bytes as they are (with their own Content-Type)
+        if isinstance(body, bytes):
+            raw_body = body
+        else:
+            raw_body = json.dumps(body).encode() if body is not None else b""
+        header_list = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        if body is not None and not any(name == b"content-type" for name, _ in header_list):
+            header_list.append((b"content-type", b"application/json"))
+        query = urlencode(params or {})
+        return await self.asgi_request(self.app, method, path, query, raw_body, header_list)
+
+
+class HttpClient:
+    """Talks to a running server over HTTP with one requests.Session per thread."""
+
+    def __init__(self, base_url: str, concurrency: int):
+        import requests
+
+        self.requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _send(self, method, path, params, body, headers):
+        if not hasattr(self.local, "session"):
+            self.local.session = self.requests.Session()
+        raw = isinstance(body, bytes)
+        response = self.local.session.request(method, self.base_url + path, params=params,
+                                              json=None if raw else body,
+                                              data=body if raw else None, headers=headers)
+        return response.status_code, dict(response.headers), response.content
+
+    async def request(self, method: str, path: str, params: Optional[dict] = None,
+                      body: Union[dict, bytes, None] = None, headers: Optional[dict] = None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._send, method, path, params, body,
+                                          headers)
+
+
+def make_tender(rng: random.Random, index: int) -> dict:
+    start = datetime(2024, 1, 1) + timedelta(days=rng.randrange(730))
+    return {
+        "item": f"Item {index}",
+        "customer": f"Customer {rng.randrange(500)}",
+        "tender_name": f"Tender {index}",
+        "status": rng.choice(["Offer", "Round 1", "Round 2", "Round 3", "Round 4", "BAFO",
+                              "Contract Signed", "Won", "Lost"]),
+        "start_date": start.date().isoformat(),
+        "expiry_date": (start + timedelta(days=rng.randrange(1, 120))).date().isoformat(),
+        "due_date": (start + timedelta(minutes=rng.randrange(200000))).isoformat(),
+        "deal_value": round(rng.uniform(1000, 500000), 2),
+        "priority": rng.choice(["High", "Medium", "Low"]),
+        "assigned_sales_rep": f"Rep {rng.randrange(40)}",
+    }
+
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Current resident set size of `pid` (this process when None), in MB."""
+    path = f"/proc/{pid or 'self'}/status"
+    if os.path.exists(path):
+        with open(path) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    if pid is None:
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def drive(client, requests: int, concurrency: int, make_request: Callable,
+                on_response: Optional[Callable] = None) -> dict:
+    """Issue `requests` calls from `concurrency` workers and summarise them."""
+    latencies = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < requests:
+            number = issued
+            issued += 1
+            method, path, params, body, headers = make_request(number)
+            sent = time.perf_counter()
+            status, _, content = await client.request(method, path, params, body, headers)
+            latencies.append((time.perf_counter() - sent) * 1000)
+            if status >= 400:
+                errors += 1
+            elif on_response:
+                on_response(content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+async def seed(client, count: int, rng: random.Random) -> List[str]:
+    ids = []
+    for offset in range(0, count, SEED_CHUNK):
+        indexes = range(offset, min(count, offset + SEED_CHUNK))
+        chunk = [make_tender(rng, index) for index in indexes]
+        status, _, body = await client.request("POST", "/api/tenders/bulk", body={"create": chunk})
+        if status != 200:
+            raise RuntimeError(f"Seeding failed with {status}: {body[:200]!r}")
+        results = json.loads(body)["results"]
+        ids.extend(result["id"] for result in results if result["status"] == "created")
+    return ids
+
+
+async def wait_for_imports(client, job_ids: List[str]):
+    while job_ids:
+        _, _, body = await client.request("GET", f"/api/tenders/import/{job_ids[0]}")
+        if json.loads(body)["status"] in ("completed", "failed"):
+            job_ids.pop(0)
+        else:
+            await asyncio.sleep(0.05)
+
+
+async def run_scenarios(client, ids: List[str], requests: int, concurrency: int,
+                        server_pid: Optional[int], rng: random.Random,
+                        only: Optional[List[str]]) -> List[dict]:
+    _, headers, _ = await client.request("GET", "/api/tenders", {"limit": 100})
+    next_cursor = headers.get("x-next-cursor")
+    etag = headers.get("etag")
+    page_params = {"limit": 100, "cursor": next_cursor} if next_cursor else {"limit": 100}
+    window_start = datetime(2024, 6, 1).date()
+    created = []
+    import_jobs = []
+
+    def get(path, params=None, headers=None):
+        return lambda n: ("GET", path, params, None, headers)
+
+    def search(n):
+        return "GET", "/api/tenders/search", {"q": f"Customer {n % 500}", "limit": 50}, None, None
+
+    def autocomplete(n):
+        params = {"prefix": f"customer {n % 50}"}
+        return "GET", "/api/tenders/filters/customers/autocomplete", params, None, None
+
+    def create(n):
+        return "POST", "/api/tenders", None, make_tender(rng, len(ids) + n), None
+
+    def update(n):
+        body = {"priority": rng.choice(["High", "Low"])}
+        return "PUT", f"/api/tenders/{ids[n % len(ids)]}", None, body, None
+
+    def patch(n):
+        body = {"priority": rng.choice(["High", "Low"])}
+        return ("PATCH", f"/api/tenders/{ids[n % len(ids)]}", None, body,
+                {"Content-Type": "application/merge-patch+json"})
+
+    def delete(n):
+        return "DELETE", f"/api/tenders/{created[n]}", None, None, None
+
+    def bulk(n):
+        tenders = [make_tender(rng, 10 ** 7 + n * 100 + i) for i in range(100)]
+        return "POST", "/api/tenders/bulk", None, {"create": tenders}, None
+
+    def import_sheet(n):
+        sheet = io.StringIO()
+        writer = csv.DictWriter(sheet, fieldnames=list(make_tender(rng, 0)))
+        writer.writeheader()
+        writer.writerows(make_tender(rng, 2 * 10 ** 7 + n * 100 + i) for i in range(100))
+        return ("POST", "/api/tenders/import", {"format": "csv"}, sheet.getvalue().encode(),
+                {"Content-Type": "text/csv"})
+
+    scenarios = [
+        ("GET /api/", get("/api/")),
+        ("GET /api/ready", get("/api/ready")),
+        ("GET /api/tenders", get("/api/tenders", {"limit": 500})),
+        ("GET /api/tenders?cursor", get("/api/tenders", page_params)),
+        ("GET /api/tenders?fields", get("/api/tenders", {
+            "limit": 500,
+            "fields": "customer,tender_name,status,start_date,expiry_date,due_date",
+        })),
+        ("GET /api/tenders ndjson", get("/api/tenders", {"limit": 1000},
+                                        {"Accept": "application/x-ndjson"})),
+        ("GET /api/tenders 304", get("/api/tenders", None, {"If-None-Match": etag or ""})),
+        ("GET /api/tenders/{id}", lambda n: ("GET", f"/api/tenders/{ids[n % len(ids)]}",
+                                             None, None, None)),
+        ("GET /api/tenders/next-due", get("/api/tenders/next-due",
+                                          {"after": "2024-06-01T00:00:00"})),
+        ("GET /api/tenders/expiring", get("/api/tenders/expiring", {"after": "2024-06-01T00:00:00",
+                                                                    "within": 7 * 24 * 3600})),
+        ("GET /api/tenders/timeline", get("/api/tenders/timeline", {
+            "start": window_start.isoformat(),
+            "end": (window_start + timedelta(days=30)).isoformat(),
+        })),
+        ("GET /api/tenders/filters/customers", get("/api/tenders/filters/customers")),
+        ("GET /api/tenders/filters/sales-reps", get("/api/tenders/filters/sales-reps")),
+        ("GET /api/tenders/search", search),
+        ("GET /api/tenders/filters/*/autocomplete", autocomplete),
+        ("GET /api/analytics/summary", get("/api/analytics/summary")),
+        ("GET /api/analytics/stage-durations", get("/api/analytics/stage-durations")),
+        ("GET /api/analytics/conversions", get("/api/analytics/conversions")),
+        ("GET /api/analytics/win-rates", get("/api/analytics/win-rates", {"by": "customer"})),
+        # One status, so a download is a realistic share of the collection
+        ("GET /api/tenders/export csv", get("/api/tenders/export",
+                                            {"format": "csv", "status": "Won"})),
+        ("GET /api/tenders/export xlsx", get("/api/tenders/export",
+                                             {"format": "xlsx", "status": "Won"})),
+        ("POST /api/tenders", create),
+        ("PUT /api/tenders/{id}", update),
+        ("PATCH /api/tenders/{id}", patch),
+        ("DELETE /api/tenders/{id}", delete),
+        ("POST /api/tenders/bulk (100)", bulk),
+        # Time to accept the upload; the rows are written by a background job
+        ("POST /api/tenders/import (100)", import_sheet),
+    ]
+
+    def remember_created(content: bytes):
+        created.append(json.loads(content)["id"])
+
+    def remember_job(content: bytes):
+        import_jobs.append(json.loads(content)["id"])
+
+    callbacks = {
+        "POST /api/tenders": remember_created,
+        "POST /api/tenders/import (100)": remember_job,
+    }
+
+    results = []
+    for name, make_request in scenarios:
+        if only and not any(pattern in name for pattern in only):
+            continue
+        count = requests
+        if name.startswith("DELETE"):
+            # Only delete what the POST scenario created, never the seed data
+            if not created:
+                continue
+            count = len(created)
+        summary = await drive(client, count, concurrency, make_request, callbacks.get(name))
+        # Queued imports would otherwise load whatever is measured next
+        await wait_for_imports(client, import_jobs)
+        summary["route"] = name
+        summary["rss_mb"] = rss_mb(server_pid)
+        results.append(summary)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(tenders: int, requests: int, concurrency: int, base_url: Optional[str],
+                    in_memory: bool, server_pid: Optional[int], only: Optional[List[str]]) -> dict:
+    rng = random.Random(42)
+    server = None
+    if base_url:
+        client = HttpClient(base_url, concurrency)
+        mode = "http"
+    else:
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ["DB_NAME"] = BENCH_DB_NAME
+        import server
+
+        if in_memory:
+            from mongomock_motor import AsyncMongoMockClient
+
+            server.client = AsyncMongoMockClient()
+            server.db = server.client[BENCH_DB_NAME]
+            await server.ensure_indexes()
+            mode = "in-process, in-memory"
+        else:
+            await server.connect().client.drop_database(BENCH_DB_NAME)
+            lifespan = server.app.router.lifespan_context(server.app)
+            await lifespan.__aenter__()
+            mode = f"in-process, {server.STORAGE_BACKEND}"
+        client = InProcessClient(server.app)
+
+    try:
+        started = time.perf_counter()
+        ids = await seed(client, tenders, rng)
+        seed_seconds = time.perf_counter() - started
+        routes = await run_scenarios(client, ids, requests, concurrency, server_pid, rng, only)
+    finally:
+        if server and not in_memory:
+            await server.db.client.drop_database(BENCH_DB_NAME)
+            await lifespan.__aexit__(None, None, None)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "mode": mode,
+            "tenders": tenders,
+            "requests_per_route": requests,
+            "concurrency": concurrency,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "routes": routes,
+    }
+
+
+def main(
+    tenders: int = typer.Option(10000, min=1, help="Tenders seeded before the run"),
+    requests: int = typer.Option(500, min=1, help="Requests per route"),
+    concurrency: int = typer.Option(16, min=1, help="Requests in flight at once"),
+    base_url: Optional[str] = typer.Option(
+        None, help="Benchmark a running server instead of in-process"),
+    server_pid: Optional[int] = typer.Option(
+        None, help="PID of the server worker, for RSS with --base-url"),
+    in_memory: bool = typer.Option(False, help="Use mongomock-motor instead of a local mongod"),
+    route: Optional[List[str]] = typer.Option(None, help="Only run routes containing this text"),
+    as_json: bool = typer.Option(False, "--json", help="Print machine-readable results"),
+    output: Optional[str] = typer.Option(None, help="Also write the JSON results to this file"),
+):
+    report = asyncio.run(
+        benchmark(tenders, requests, concurrency, base_url, in_memory, server_pid, route)
+    )
+    if output:
+        with open(output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+    meta = report["meta"]
+    print(f"{meta['mode']}: {meta['tenders']} tenders, {meta['concurrency']} concurrent, "
+          f"{meta['requests_per_route']} requests per route (commit {meta['commit']})")
+    print(f"{'route':<42} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'rss MB':>8}")
+    for row in report["routes"]:
+        print(f"{row['route']:<42} {row['throughput_rps']:>9} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>7} {row['rss_mb'] or '-':>8}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
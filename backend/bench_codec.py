@@ -0,0 +1,126 @@
+"""Micro-benchmark of the per-document cost of turning stored tenders into API payloads.
+
+Compares the original read path (ISO-string dates parsed with fromisoformat,
+then a full ``Tender(**doc)`` validation) with the ``tender_payload`` codec on
+native BSON datetimes, both on their own and followed by JSON encoding. No
+database is needed; documents are synthesised in the shape Motor returns
+them.
+
+    python bench_codec.py --sizes 1000 --sizes 100000
+"""
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import typer
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+from server import (  # noqa: E402
+    PriorityLevel, Tender, TenderStatus, dates_to_bson, encode_json, tender_payload
+)
+
+
+def make_documents(count: int, legacy: bool) -> List[dict]:
+    rng = random.Random(count)
+    base = datetime(2024, 1, 1)
+    documents = []
+    for index in range(count):
+        start = (base + timedelta(days=rng.randrange(365))).date()
+        tender = Tender(
+            item=f"Item {index}",
+            customer=f"Customer {rng.randrange(200)}",
+            tender_name=f"Tender {index}",
+            status=rng.choice(list(TenderStatus)),
+            start_date=start,
+            expiry_date=start + timedelta(days=rng.randrange(1, 90)),
+            due_date=base + timedelta(minutes=rng.randrange(500000)),
+            deal_value=round(rng.uniform(1000, 500000), 2),
+            priority=rng.choice(list(PriorityLevel)),
+            assigned_sales_rep=f"Rep {rng.randrange(25)}",
+        )
+        document = tender.model_dump()
+        if legacy:
+            for field in ("start_date", "expiry_date", "due_date"):
+                document[field] = document[field].isoformat()
+        else:
+            dates_to_bson(document)
+        # Motor hands back plain strings for enums and adds the ObjectId
+        document["status"] = document["status"].value
+        document["priority"] = document["priority"].value
+        document["_id"] = uuid.uuid4().bytes[:12]
+        documents.append(document)
+    return documents
+
+
+def legacy_decode(tender: dict) -> Tender:
+    if isinstance(tender.get('start_date'), str):
+        tender['start_date'] = datetime.fromisoformat(tender['start_date']).date()
+    if isinstance(tender.get('expiry_date'), str):
+        tender['expiry_date'] = datetime.fromisoformat(tender['expiry_date']).date()
+    if isinstance(tender.get('due_date'), str):
+        tender['due_date'] = datetime.fromisoformat(tender['due_date'])
+    return Tender(**tender)
+
+
+def legacy_encode(tender: dict) -> bytes:
+    return legacy_decode(tender).model_dump_json().encode()
+
+
+def codec_encode(tender: dict) -> bytes:
+    return encode_json(tender_payload(tender))
+
+
+def time_per_document(decode, documents: List[dict], repeat: int) -> float:
+    """Best-of-`repeat` wall time per document, in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        # The legacy path mutates its input, so every round gets fresh copies
+        batch = [dict(document) for document in documents]
+        started = time.perf_counter()
+        for document in batch:
+            decode(document)
+        best = min(best, time.perf_counter() - started)
+    return best / len(documents) * 1e6
+
+
+def main(
+    sizes: List[int] = typer.Option([1000, 100000], help="Number of tenders per run"),
+    repeat: int = typer.Option(3, min=1, help="Rounds per measurement; the best is kept"),
+    as_json: bool = typer.Option(False, "--json", help="Print machine-readable results"),
+):
+    cases = [
+        ("decode", legacy_decode, tender_payload),
+        ("decode+encode", legacy_encode, codec_encode),
+    ]
+    results = []
+    for size in sizes:
+        legacy_documents = make_documents(size, legacy=True)
+        documents = make_documents(size, legacy=False)
+        for name, before_path, after_path in cases:
+            before = time_per_document(before_path, legacy_documents, repeat)
+            after = time_per_document(after_path, documents, repeat)
+            results.append({
+                "tenders": size,
+                "path": name,
+                "before_us_per_doc": round(before, 2),
+                "after_us_per_doc": round(after, 2),
+                "speedup": round(before / after, 2),
+            })
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'tenders':>10} {'path':>14} {'before us/doc':>14} {'after us/doc':>13} {'speedup':>8}")
+    for row in results:
+        print(f"{row['tenders']:>10} {row['path']:>14} {row['before_us_per_doc']:>14} "
+              f"{row['after_us_per_doc']:>13} {row['speedup']:>7}x")
+
+
+if __name__ == "__main__":
+    typer.run(main)
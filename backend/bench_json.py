@@ -0,0 +1,91 @@
+"""Throughput and tail latency of the default vs. the fast JSON response path.
+
+Two in-process routes serve the same synthesised tenders: one the way the
+API does by default (``response_model=List[Tender]``, which revalidates the
+payloads and runs them through ``jsonable_encoder`` and stdlib ``json``) and
+one the way it does with ``FAST_JSON=1`` (codec payloads encoded directly).
+Requests are driven straight through the ASGI interface, so neither the
+network nor MongoDB is part of the measurement.
+
+    python bench_json.py --sizes 1000 --sizes 10000 --sizes 100000 --json
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import List
+
+import typer
+from fastapi import FastAPI
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+from bench_codec import make_documents  # noqa: E402
+from server import Tender, asgi_request, json_response, orjson, tender_payload  # noqa: E402
+
+
+def build_app(documents: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=List[Tender])
+    async def default_path():
+        return [tender_payload(document) for document in documents]
+
+    @app.get("/fast")
+    async def fast_path():
+        return json_response([tender_payload(document) for document in documents])
+
+    return app
+
+
+async def request(app: FastAPI, path: str) -> int:
+    """Run one GET through the ASGI app and return the size of the body."""
+    _, _, body = await asgi_request(app, "GET", path)
+    return len(body)
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> dict:
+    await request(app, path)  # warm up routing and validator caches
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        sent = time.perf_counter()
+        size = await request(app, path)
+        latencies.append((time.perf_counter() - sent) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "responses_per_s": round(requests / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        "bytes": size,
+    }
+
+
+def main(
+    sizes: List[int] = typer.Option([1000, 10000, 100000], help="Rows per response"),
+    requests: int = typer.Option(20, min=1, help="Requests per size and path"),
+    as_json: bool = typer.Option(False, "--json", help="Print machine-readable results"),
+):
+    results = []
+    for size in sizes:
+        app = build_app(make_documents(size, legacy=False))
+        for path in ("default", "fast"):
+            row = asyncio.run(measure(app, f"/{path}", requests))
+            results.append({"rows": size, "path": path, **row})
+
+    encoder = "orjson" if orjson else "pydantic-core"
+    if as_json:
+        print(json.dumps({"encoder": encoder, "results": results}, indent=2))
+        return
+    print(f"encoder: {encoder}")
+    print(f"{'rows':>8} {'path':>8} {'resp/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'bytes':>11}")
+    for row in results:
+        print(f"{row['rows']:>8} {row['path']:>8} {row['responses_per_s']:>9} "
+              f"{row['p50_ms']:>9} {row['p99_ms']:>9} {row['bytes']:>11}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,791 @@
+"""Embedded storage engine for the desktop build: SQLite in WAL mode behind the
+part of the Motor API the routes use.
+
+Every collection is a table of JSON documents keyed by ``_id``. Filters,
+sorts and the ``IndexModel`` declarations in ``server.py`` are translated to
+``json_extract`` expressions, so each declared index becomes a SQLite
+expression index and the same queries stay index-backed without a database
+process to launch. Datetimes are stored as tagged, fixed-width ISO strings,
+which compare and sort like BSON dates, and come back as ``datetime`` objects
+the way Motor returns them.
+
+All statements of a client run on one worker thread, so a write is never
+interleaved with another and ``find_one_and_*`` stay atomic. Unsupported
+query operators, update operators and aggregation stages raise
+``NotImplementedError`` rather than silently matching the wrong documents.
+
+    STORAGE_BACKEND=embedded EMBEDDED_DATA_DIR=./data DB_NAME=tenders uvicorn server:app
+"""
+import asyncio
+import copy
+import json
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, time, timezone
+from enum import Enum
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+DATE_PREFIX = "$date:"
+# Strings tagged as dates sort between these two bounds
+DATE_RANGE = (DATE_PREFIX, DATE_PREFIX[:-1] + chr(ord(DATE_PREFIX[-1]) + 1))
+NAME_PATTERN = re.compile(r"^[A-Za-z_]\w*$")
+FIELD_PATTERN = re.compile(r"^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$")
+CURSOR_BATCH_SIZE = 500
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+# Value encoding
+def encode_value(value):
+    """Turn a Python value into what is stored in (and compared against) SQLite."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        # Millisecond precision, like BSON
+        return DATE_PREFIX + value.isoformat(timespec="milliseconds")
+    if isinstance(value, date):
+        return encode_value(datetime.combine(value, time.min))
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+def json_default(value):
+    encoded = encode_value(value)
+    if encoded is value:
+        raise TypeError(f"Cannot store {type(value).__name__} values")
+    return encoded
+
+def dumps(document: dict) -> str:
+    return json.dumps(document, default=json_default, separators=(",", ":"))
+
+def decode_value(value):
+    if type(value) is str:
+        if value.startswith(DATE_PREFIX):
+            return datetime.fromisoformat(value[len(DATE_PREFIX):])
+        return value
+    if type(value) is dict:
+        return {key: decode_value(item) for key, item in value.items()}
+    if type(value) is list:
+        return [decode_value(item) for item in value]
+    return value
+
+def load_document(_id: str, body: str) -> dict:
+    document = {"_id": _id}
+    for key, value in json.loads(body).items():
+        document[key] = decode_value(value)
+    return document
+
+
+# Query translation
+def quote_name(name: str) -> str:
+    if not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid collection name: {name!r}")
+    return f'"{name}"'
+
+def field_expression(field: str) -> str:
+    """SQL for a document field; identical text in filters, sorts and indexes."""
+    if field == "_id":
+        return "_id"
+    if not FIELD_PATTERN.match(field):
+        raise NotImplementedError(f"Unsupported field name: {field!r}")
+    return f"json_extract(doc, '$.{field}')"
+
+def field_type(field: str) -> str:
+    return f"json_type(doc, '$.{field}')"
+
+def compile_condition(field: str, operator: str, operand) -> Tuple[str, list]:
+    expression = field_expression(field)
+    if operator == "$eq":
+        if operand is None:
+            return f"{expression} IS NULL", []
+        return f"{expression} = ?", [encode_value(operand)]
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        symbol = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[operator]
+        if isinstance(operand, datetime):
+            # Type bracketing, as in Mongo: a date bound never matches a string
+            return (f"({expression} {symbol} ? AND {expression} >= ? AND {expression} < ?)",
+                    [encode_value(operand), *DATE_RANGE])
+        return f"{expression} {symbol} ?", [encode_value(operand)]
+    if operator == "$in":
+        values = [encode_value(value) for value in operand if value is not None]
+        clauses = [f"{expression} IN ({', '.join('?' * len(values))})"] if values else []
+        if None in operand:
+            clauses.append(f"{expression} IS NULL")
+        return (f"({' OR '.join(clauses)})" if clauses else "0"), values
+    if operator == "$exists":
+        return f"{field_type(field)} IS {'NOT ' if operand else ''}NULL", []
+    if operator == "$type":
+        if operand == "date":
+            return f"({expression} >= ? AND {expression} < ?)", list(DATE_RANGE)
+        if operand == "string":
+            is_date = f"{expression} >= ? AND {expression} < ?"
+            return f"({field_type(field)} = 'text' AND NOT ({is_date}))", list(DATE_RANGE)
+    raise NotImplementedError(f"Unsupported query operator: {operator}")
+
+def is_operator_document(condition) -> bool:
+    if not isinstance(condition, dict) or not condition:
+        return False
+    return all(operator.startswith("$") for operator in condition)
+
+def compile_filter(query: Optional[dict]) -> Tuple[str, list]:
+    """Translate a Mongo filter document into a SQL condition and its parameters."""
+    clauses = []
+    params = []
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            parts = [compile_filter(sub_query) for sub_query in condition]
+            clauses.append(f"({' OR '.join(f'({sql})' for sql, _ in parts) or '0'})")
+            for _, part_params in parts:
+                params.extend(part_params)
+        elif key.startswith("$"):
+            raise NotImplementedError(f"Unsupported query operator: {key}")
+        elif is_operator_document(condition):
+            for operator, operand in condition.items():
+                sql, condition_params = compile_condition(key, operator, operand)
+                clauses.append(sql)
+                params.extend(condition_params)
+        else:
+            sql, condition_params = compile_condition(key, "$eq", condition)
+            clauses.append(sql)
+            params.extend(condition_params)
+    return " AND ".join(clauses) or "1", params
+
+def normalize_sort(key_or_list, direction=None) -> List[tuple]:
+    if not key_or_list:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+def compile_sort(sort: List[tuple], score: Optional[str] = None) -> str:
+    if not sort:
+        return ""
+    terms = []
+    for field, direction in sort:
+        if isinstance(direction, dict):
+            if direction.get("$meta") != "textScore" or score is None:
+                raise OperationFailure("textScore sort requires a $text query")
+            terms.append(f"{score} DESC")
+        else:
+            terms.append(f"{field_expression(field)} {'DESC' if direction == -1 else 'ASC'}")
+    return " ORDER BY " + ", ".join(terms)
+
+def text_match(search: str) -> Optional[str]:
+    """Turn a $text $search string into an FTS5 query: any term or "phrase"
+    matches, as in Mongo; negated -terms are ignored."""
+    phrases = re.findall(r'"([^"]+)"', search)
+    terms = [term for term in re.sub(r'"[^"]*"', " ", search).split() if not term.startswith("-")]
+    tokens = ['"' + token.replace('"', '""') + '"' for token in phrases + terms]
+    return " OR ".join(tokens) or None
+
+def meta_fields(projection: Optional[dict]) -> List[str]:
+    return [field for field, value in (projection or {}).items() if isinstance(value, dict)]
+
+def project(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return document
+    computed = meta_fields(projection)
+    included = {
+        field for field, value in projection.items()
+        if value and field != "_id" and field not in computed
+    }
+    keep_id = bool(projection.get("_id", 1))
+    if included:
+        return {key: value for key, value in document.items()
+                if key in included or key in computed or (key == "_id" and keep_id)}
+    return {key: value for key, value in document.items() if projection.get(key, 1)}
+
+def load_row(row: tuple, projection: Optional[dict]) -> dict:
+    document = load_document(row[0], row[1])
+    if len(row) > 2:
+        # The text score selected for {"$meta": "textScore"}
+        for field in meta_fields(projection):
+            document[field] = row[2]
+    return project(document, projection)
+
+
+# Updates
+def set_path(document: dict, path: str, value):
+    *parents, leaf = path.split(".")
+    for parent in parents:
+        document = document.setdefault(parent, {})
+    document[leaf] = value
+
+def get_path(document: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+def apply_update(document: dict, update: dict, inserting: bool = False) -> dict:
+    """Return a copy of `document` with a Mongo update applied."""
+    updated = copy.deepcopy(document)
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            if operator == "$set" or (operator == "$setOnInsert" and inserting):
+                set_path(updated, path, value)
+            elif operator == "$setOnInsert":
+                continue
+            elif operator == "$inc":
+                set_path(updated, path, (get_path(updated, path) or 0) + value)
+            else:
+                raise NotImplementedError(f"Unsupported update operator: {operator}")
+    return updated
+
+def upsert_seed(query: dict) -> dict:
+    """The equality fields of a filter, which an upserted document starts from."""
+    return {
+        key: value for key, value in query.items()
+        if not key.startswith("$") and not is_operator_document(value)
+    }
+
+
+# Aggregation: an optional leading $match and one $group, keyed on field paths
+# or on a $dateToString of one (optionally $convert-ed to a date)
+ACCUMULATORS = {
+    "$sum": "coalesce(SUM({}), 0)",
+    "$avg": "AVG({})",
+    "$min": "MIN({})",
+    "$max": "MAX({})",
+}
+
+def operand_sql(operand) -> Tuple[str, list]:
+    if isinstance(operand, str) and operand.startswith("$"):
+        return field_expression(operand[1:]), []
+    if isinstance(operand, dict) and list(operand) == ["$dateToString"]:
+        # SQLite's strftime shares Mongo's %Y, %m, %d, %H, %M and %S
+        spec = operand["$dateToString"]
+        sql, params = operand_sql(spec["date"])
+        return f"strftime(?, substr({sql}, {len(DATE_PREFIX) + 1}))", [spec["format"], *params]
+    if isinstance(operand, dict) and list(operand) == ["$convert"]:
+        # Only to a date, with onError: null; stored dates are kept and ISO
+        # strings are parsed, anything else becomes NULL
+        spec = operand["$convert"]
+        if spec.get("to") != "date" or spec.get("onError", "") is not None:
+            raise NotImplementedError(f"Unsupported $convert: {spec}")
+        sql, params = operand_sql(spec["input"])
+        return (
+            f"CASE WHEN substr({sql}, 1, {len(DATE_PREFIX)}) = ? THEN {sql} "
+            f"WHEN typeof({sql}) = 'text' AND strftime('%s', {sql}) IS NOT NULL "
+            f"THEN ? || strftime('%Y-%m-%dT%H:%M:%f', {sql}) END"
+        ), [*params, DATE_PREFIX, *params, *params, *params, DATE_PREFIX, *params]
+    if isinstance(operand, (int, float)) and not isinstance(operand, bool):
+        return repr(operand), []
+    return "?", [encode_value(operand)]
+
+
+class EmbeddedCursor:
+    """The chainable subset of a Motor cursor: sort, limit, batch_size, to_list
+    and ``async for``."""
+
+    def __init__(self, collection: "EmbeddedCollection", query: Optional[dict],
+                 projection: Optional[dict]):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+        self._batch_size = CURSOR_BATCH_SIZE
+
+    def sort(self, key_or_list, direction=None) -> "EmbeddedCursor":
+        self._sort = normalize_sort(key_or_list, direction)
+        return self
+
+    def limit(self, limit: int) -> "EmbeddedCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "EmbeddedCursor":
+        self._batch_size = batch_size
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        limit = min(filter(None, (self._limit, length)), default=0)
+        return await self._collection._run(
+            self._collection._find, self._query, self._projection, self._sort, limit
+        )
+
+    async def __aiter__(self):
+        collection = self._collection
+        rows = await collection._run(
+            collection._open, self._query, self._sort, self._limit, self._projection
+        )
+        try:
+            while True:
+                batch = await collection._run(rows.fetchmany, self._batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield load_row(row, self._projection)
+        finally:
+            rows.close()
+
+
+class EmbeddedResultCursor:
+    """Cursor over results computed in one go, as returned by aggregate()."""
+
+    def __init__(self, compute):
+        self._compute = compute
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        results = await self._compute()
+        return results[:length] if length else results
+
+    async def __aiter__(self):
+        for result in await self._compute():
+            yield result
+
+
+class EmbeddedCollection:
+    def __init__(self, database: "EmbeddedDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._table = quote_name(name)
+        self._created = False
+        # (FTS5 table, fields, weights) once the text index has been declared
+        self._text_index = None
+
+    async def _run(self, function, *args):
+        return await self.database._run(function, *args)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if not self._created:
+            self.database._conn.execute(
+                # The integer key keeps rowids stable across VACUUM for the text index
+                f"CREATE TABLE IF NOT EXISTS {self._table} "
+                f"(rid INTEGER PRIMARY KEY, _id TEXT NOT NULL UNIQUE, doc TEXT NOT NULL)"
+            )
+            self._created = True
+        return self.database._conn
+
+    def _select_sql(self, query: Optional[dict], sort: List[tuple], limit: int = 0,
+                    projection: Optional[dict] = None) -> Tuple[str, list]:
+        query = dict(query or {})
+        text = query.pop("$text", None)
+        where, params = compile_filter(query)
+        columns = "_id, doc"
+        source = self._table
+        score = None
+        if text is not None:
+            if self._text_index is None:
+                raise OperationFailure(f"text index required for $text query on {self.name}")
+            table, fields, weights = self._text_index
+            field_weights = ", ".join(str(float(weights.get(field, 1))) for field in fields)
+            score = f"-bm25({table}, {field_weights})"
+            source = f"{self._table} JOIN {table} ON {table}.rowid = {self._table}.rid"
+            match = text_match(text["$search"])
+            where = f"{table} MATCH ? AND {where}" if match else "0"
+            params = [match] + params if match else []
+            if meta_fields(projection):
+                columns += f", {score}"
+        sql = f"SELECT {columns} FROM {source} WHERE {where}{compile_sort(sort, score)}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return sql, params
+
+    def _open(self, query, sort=(), limit=0, projection=None) -> sqlite3.Cursor:
+        return self._conn.execute(*self._select_sql(query, sort, limit, projection))
+
+    def _find(self, query, projection=None, sort=(), limit=0) -> List[dict]:
+        rows = self._open(query, sort, limit, projection).fetchall()
+        return [load_row(row, projection) for row in rows]
+
+    # Indexes
+    def _create_indexes(self, indexes) -> List[str]:
+        names = []
+        for index in indexes:
+            spec = index.document
+            if "text" in spec["key"].values():
+                self._create_text_index(spec)
+                names.append(spec["name"])
+                continue
+            if any(not isinstance(direction, int) for direction in spec["key"].values()):
+                raise OperationFailure(
+                    f"Index {spec['name']} uses a key type the embedded engine lacks"
+                )
+            columns = ", ".join(
+                f"{field_expression(field)}{' DESC' if direction == -1 else ''}"
+                for field, direction in spec["key"].items()
+            )
+            unique = "UNIQUE " if spec.get("unique") else ""
+            name = quote_name(f"{self.name}__{spec['name']}")
+            try:
+                self._conn.execute(
+                    f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {self._table} ({columns})"
+                )
+            except sqlite3.IntegrityError as exc:
+                raise OperationFailure(f"Cannot build index {spec['name']}: {exc}")
+            names.append(spec["name"])
+        return names
+
+    def _create_text_index(self, spec: dict):
+        """Back a Mongo text index with an FTS5 table that triggers keep in sync."""
+        name = f"{self.name}__{spec['name']}"
+        table = quote_name(name)
+        fields = [field for field, kind in spec["key"].items() if kind == "text"]
+        columns = ", ".join(quote_name(field) for field in fields)
+        if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone():
+            def values(row):
+                return ", ".join(f"json_extract({row}.doc, '$.{field}')" for field in fields)
+            assignments = ", ".join(
+                f"{quote_name(field)} = json_extract(new.doc, '$.{field}')" for field in fields
+            )
+            with self.database._transaction():
+                self._conn.execute(
+                    f"CREATE VIRTUAL TABLE {table} "
+                    f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2')"
+                )
+                self._conn.execute(
+                    f"INSERT INTO {table} (rowid, {columns}) "
+                    f"SELECT rid, {values('t')} FROM {self._table} t"
+                )
+                self._conn.execute(
+                    f"CREATE TRIGGER {quote_name(name + '_insert')} "
+                    f"AFTER INSERT ON {self._table} BEGIN "
+                    f"INSERT INTO {table} (rowid, {columns}) VALUES (new.rid, {values('new')}); END"
+                )
+                self._conn.execute(
+                    f"CREATE TRIGGER {quote_name(name + '_update')} "
+                    f"AFTER UPDATE OF doc ON {self._table} BEGIN "
+                    f"UPDATE {table} SET {assignments} WHERE rowid = new.rid; END"
+                )
+                self._conn.execute(
+                    f"CREATE TRIGGER {quote_name(name + '_delete')} "
+                    f"AFTER DELETE ON {self._table} BEGIN "
+                    f"DELETE FROM {table} WHERE rowid = old.rid; END"
+                )
+        self._text_index = (table, fields, spec.get("weights", {}))
+
+    async def create_indexes(self, indexes) -> List[str]:
+        return await self._run(self._create_indexes, indexes)
+
+    def _index_information(self) -> Dict[str, dict]:
+        prefix = f"{self.name}__"
+        information = {"_id_": {"key": [("_id", 1)]}}
+        for name, sql in self._conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE (type = 'index' AND tbl_name = ?) "
+            "OR (type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%')", (self.name,)
+        ):
+            if name.startswith(prefix):
+                information[name[len(prefix):]] = {"sql": sql}
+        return information
+
+    async def index_information(self) -> Dict[str, dict]:
+        return await self._run(self._index_information)
+
+    # Reads
+    def find(self, filter: Optional[dict] = None,
+             projection: Optional[dict] = None) -> EmbeddedCursor:
+        return EmbeddedCursor(self, filter, projection)
+
+    async def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None,
+                       sort=None) -> Optional[dict]:
+        found = await self._run(self._find, filter, projection, normalize_sort(sort), 1)
+        return found[0] if found else None
+
+    def _count(self, query) -> int:
+        where, params = compile_filter(query)
+        sql = f"SELECT COUNT(*) FROM {self._table} WHERE {where}"
+        return self._conn.execute(sql, params).fetchone()[0]
+
+    async def count_documents(self, filter: dict) -> int:
+        return await self._run(self._count, filter)
+
+    def _distinct(self, field: str, query) -> list:
+        where, params = compile_filter(query)
+        expression = field_expression(field)
+        rows = self._conn.execute(
+            f"SELECT DISTINCT {expression} FROM {self._table} "
+            f"WHERE {where} AND {expression} IS NOT NULL",
+            params,
+        )
+        return [decode_value(value) for value, in rows]
+
+    async def distinct(self, key: str, filter: Optional[dict] = None) -> list:
+        return await self._run(self._distinct, key, filter)
+
+    def _aggregate(self, pipeline: List[dict]) -> List[dict]:
+        stages = list(pipeline)
+        where, params = "1", []
+        if stages and "$match" in stages[0]:
+            where, params = compile_filter(stages.pop(0)["$match"])
+        if len(stages) != 1 or "$group" not in stages[0]:
+            raise NotImplementedError("The embedded engine aggregates [$match,] $group")
+        group = dict(stages.pop(0)["$group"])
+        key = group.pop("_id")
+        # {"field": operand, ...} is a compound key; {"$op": ...} a single expression
+        compound = isinstance(key, dict) and not any(name.startswith("$") for name in key)
+        keys = list(key.items()) if compound else [(None, key)]
+
+        columns, group_by, select_params = [], [], []
+        for index, (_, operand) in enumerate(keys):
+            sql, operand_params = operand_sql(operand)
+            columns.append(f"{sql} AS group_{index}")
+            select_params.extend(operand_params)
+            if isinstance(operand, dict) or isinstance(operand, str) and operand.startswith("$"):
+                group_by.append(f"group_{index}")
+        for name, accumulator in group.items():
+            (operator, operand), = accumulator.items()
+            if operator not in ACCUMULATORS:
+                raise NotImplementedError(f"Unsupported accumulator: {operator}")
+            sql, operand_params = operand_sql(operand)
+            columns.append(ACCUMULATORS[operator].format(sql))
+            select_params.extend(operand_params)
+        sql = f"SELECT COUNT(*), {', '.join(columns)} FROM {self._table} WHERE {where}"
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)}"
+
+        results = []
+        for count, *values in self._conn.execute(sql, select_params + params):
+            if not count:
+                continue
+            values = [decode_value(value) for value in values]
+            group_id = dict(zip(key, values[:len(keys)])) if compound else values[0]
+            results.append({"_id": group_id, **dict(zip(group, values[len(keys):]))})
+        return results
+
+    def aggregate(self, pipeline: List[dict]) -> EmbeddedResultCursor:
+        return EmbeddedResultCursor(lambda: self._run(self._aggregate, pipeline))
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams are not available with the embedded engine")
+
+    # Writes
+    def _duplicate_key(self, exc: sqlite3.IntegrityError) -> DuplicateKeyError:
+        message = f"E11000 duplicate key error collection: {self.name}: {exc}"
+        return DuplicateKeyError(message, 11000)
+
+    def _insert(self, document: dict):
+        if "_id" not in document:
+            document["_id"] = str(ObjectId())
+        body = {key: value for key, value in document.items() if key != "_id"}
+        try:
+            self._conn.execute(f"INSERT INTO {self._table} (_id, doc) VALUES (?, ?)",
+                               (str(document["_id"]), dumps(body)))
+        except sqlite3.IntegrityError as exc:
+            raise self._duplicate_key(exc)
+        return document["_id"]
+
+    def _write(self, document: dict):
+        body = {key: value for key, value in document.items() if key != "_id"}
+        try:
+            self._conn.execute(f"UPDATE {self._table} SET doc = ? WHERE _id = ?",
+                               (dumps(body), document["_id"]))
+        except sqlite3.IntegrityError as exc:
+            raise self._duplicate_key(exc)
+
+    def _update(self, query, update, upsert=False, sort=()) -> SimpleNamespace:
+        matched = modified = 0
+        before = after = upserted_id = None
+        for _id, body in self._open(query, sort, 1).fetchall():
+            before = load_document(_id, body)
+            after = apply_update(before, update)
+            matched = 1
+            if after != before:
+                self._write(after)
+                modified = 1
+        if not matched and upsert:
+            seed = upsert_seed(query)
+            seed["_id"] = seed.get("_id") or str(ObjectId())
+            after = apply_update(seed, update, inserting=True)
+            upserted_id = self._insert(after)
+        return SimpleNamespace(matched_count=matched, modified_count=modified,
+                               upserted_id=upserted_id, before=before, after=after)
+
+    def _delete(self, query, multi=False, sort=()) -> List[dict]:
+        rows = self._open(query, sort, 0 if multi else 1).fetchall()
+        self._conn.executemany(f"DELETE FROM {self._table} WHERE _id = ?",
+                               [(_id,) for _id, _ in rows])
+        return [load_document(_id, body) for _id, body in rows]
+
+    def _transaction(self, function, *args):
+        with self.database._transaction():
+            return function(*args)
+
+    async def insert_one(self, document: dict) -> SimpleNamespace:
+        inserted_id = await self._run(self._transaction, self._insert, document)
+        return SimpleNamespace(inserted_id=inserted_id, acknowledged=True)
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True) -> SimpleNamespace:
+        result = await self.bulk_write([InsertOne(document) for document in documents],
+                                       ordered=ordered)
+        inserted_ids = [document["_id"] for document in documents if "_id" in document]
+        return SimpleNamespace(inserted_ids=inserted_ids, acknowledged=result.acknowledged)
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False) -> SimpleNamespace:
+        return await self._run(self._transaction, self._update, filter, update, upsert)
+
+    async def delete_many(self, filter: dict) -> SimpleNamespace:
+        deleted = await self._run(self._transaction, self._delete, filter, True)
+        return SimpleNamespace(deleted_count=len(deleted))
+
+    async def find_one_and_update(self, filter: dict, update: dict,
+                                  projection: Optional[dict] = None, sort=None,
+                                  upsert: bool = False,
+                                  return_document: bool = False) -> Optional[dict]:
+        result = await self._run(self._transaction, self._update, filter, update, upsert,
+                                 normalize_sort(sort))
+        document = result.after if return_document else result.before
+        return project(document, projection) if document else None
+
+    async def find_one_and_delete(self, filter: dict, projection: Optional[dict] = None,
+                                  sort=None) -> Optional[dict]:
+        deleted = await self._run(self._transaction, self._delete, filter, False,
+                                  normalize_sort(sort))
+        return project(deleted[0], projection) if deleted else None
+
+    def _bulk_write(self, requests: list, ordered: bool) -> SimpleNamespace:
+        counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0}
+        errors = []
+        with self.database._transaction():
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        counts["nInserted"] += 1
+                    elif isinstance(request, UpdateOne):
+                        result = self._update(request._filter, request._doc, request._upsert)
+                        counts["nMatched"] += result.matched_count
+                        counts["nModified"] += result.modified_count
+                        counts["nUpserted"] += result.upserted_id is not None
+                    elif isinstance(request, DeleteOne):
+                        counts["nRemoved"] += len(self._delete(request._filter))
+                    else:
+                        raise NotImplementedError(
+                            f"Unsupported bulk operation: {type(request).__name__}"
+                        )
+                except DuplicateKeyError as exc:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(exc)})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "upserted": [], **counts,
+            })
+        return SimpleNamespace(
+            acknowledged=True, inserted_count=counts["nInserted"], matched_count=counts["nMatched"],
+            modified_count=counts["nModified"], deleted_count=counts["nRemoved"],
+            upserted_count=counts["nUpserted"],
+        )
+
+    async def bulk_write(self, requests: list, ordered: bool = True) -> SimpleNamespace:
+        return await self._run(self._bulk_write, list(requests), ordered)
+
+
+class EmbeddedDatabase:
+    def __init__(self, client: "EmbeddedClient", name: str):
+        self.client = client
+        self.name = name
+        quote_name(name)
+        self.path = client.directory / f"{name}.sqlite3"
+        # Only ever used from the client's single worker thread
+        self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        for pragma in PRAGMAS:
+            self._conn.execute(pragma)
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> EmbeddedCollection:
+        if name not in self._collections:
+            self._collections[name] = EmbeddedCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> EmbeddedCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.client._executor, function, *args)
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _explain(self, command: dict) -> dict:
+        collection = self[command["find"]]
+        sql, params = collection._select_sql(
+            command.get("filter"), normalize_sort(command.get("sort")), command.get("limit", 0)
+        )
+        details = [row[-1] for row in collection._conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        # Reported with Mongo's stage names so the index advisor reads both engines
+        indexed = any("USING" in detail and "INDEX" in detail for detail in details)
+        if indexed:
+            plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+        else:
+            plan = {"stage": "COLLSCAN"}
+        if any("TEMP B-TREE" in detail for detail in details):
+            plan = {"stage": "SORT", "inputStage": plan}
+        return {"queryPlanner": {"winningPlan": plan, "sqlitePlan": details}, "ok": 1.0}
+
+    async def command(self, command: dict, **kwargs) -> dict:
+        name = next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        if name == "explain" and "find" in command["explain"]:
+            return await self._run(self._explain, command["explain"])
+        raise OperationFailure(f"Command {name} is not supported by the embedded engine")
+
+    def _drop(self):
+        # Virtual tables first: dropping one also drops its shadow tables
+        tables = self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "ORDER BY sql LIKE 'CREATE VIRTUAL TABLE%' DESC"
+        ).fetchall()
+        for name, in tables:
+            self._conn.execute(f"DROP TABLE IF EXISTS {quote_name(name)}")
+        for collection in self._collections.values():
+            collection._created = False
+            collection._text_index = None
+
+
+class EmbeddedClient:
+    """Stands in for AsyncIOMotorClient; every database is one SQLite file in `directory`."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedded-db")
+        self._databases = {}
+
+    def __getitem__(self, name: str) -> EmbeddedDatabase:
+        if name not in self._databases:
+            self._databases[name] = EmbeddedDatabase(self, name)
+        return self._databases[name]
+
+    async def drop_database(self, name: str):
+        database = self[name]
+        await database._run(database._drop)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for database in self._databases.values():
+            database._conn.close()
+        self._databases = {}
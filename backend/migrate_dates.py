@@ -0,0 +1,89 @@
+"""Rewrite legacy ISO-string tender dates as native BSON datetimes.
+
+Safe to run while the API is serving traffic: every update is conditional on
+the field still holding the string that was read, and migrated documents drop
+out of the selection query, so an interrupted run simply resumes where it
+stopped the next time it is started. Afterwards the tender dimensions are
+rebuilt, repairing rollups that writes to unmigrated tenders may have missed.
+
+    python migrate_dates.py --batch-size 1000
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+import typer
+from pymongo import UpdateOne
+
+from server import DATE_FIELDS, DATETIME_FIELDS, connect, dates_to_bson, rebuild_dimensions
+
+logger = logging.getLogger("migrate_dates")
+
+STRING_DATE_FIELDS = DATE_FIELDS + DATETIME_FIELDS
+LEGACY_QUERY = {"$or": [{field: {"$type": "string"}} for field in STRING_DATE_FIELDS]}
+
+
+def convert_legacy_dates(tender: dict) -> dict:
+    """Return the $set document turning a tender's string dates into datetimes."""
+    converted = {}
+    for field in STRING_DATE_FIELDS:
+        if isinstance(tender.get(field), str):
+            converted[field] = datetime.fromisoformat(tender[field])
+    return dates_to_bson(converted)
+
+
+async def migrate(batch_size: int, dry_run: bool = False) -> dict:
+    db = connect()
+    total = await db.tenders.count_documents(LEGACY_QUERY)
+    logger.info("%d tenders still store string dates", total)
+
+    migrated = failed = 0
+    last_id = None
+    while True:
+        # Paging on _id keeps unparseable documents from being re-read forever
+        query = dict(LEGACY_QUERY)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        projection = {field: 1 for field in STRING_DATE_FIELDS}
+        cursor = db.tenders.find(query, projection).sort("_id", 1).limit(batch_size)
+        batch = await cursor.to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for tender in batch:
+            try:
+                converted = convert_legacy_dates(tender)
+            except ValueError as exc:
+                failed += 1
+                logger.warning("Skipping tender %s: %s", tender["_id"], exc)
+                continue
+            # Only overwrite values nobody has rewritten since we read them
+            expected = {"_id": tender["_id"]}
+            expected.update({field: tender[field] for field in converted})
+            operations.append(UpdateOne(expected, {"$set": converted}))
+
+        if operations and not dry_run:
+            result = await db.tenders.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+        else:
+            migrated += len(operations)
+        logger.info("Migrated %d/%d tenders (%d skipped)", migrated, total, failed)
+
+    if not dry_run:
+        await rebuild_dimensions()
+        logger.info("Rebuilt the tender dimensions")
+    return {"total": total, "migrated": migrated, "failed": failed}
+
+
+def main(
+    batch_size: int = typer.Option(1000, min=1, help="Documents rewritten per bulk_write"),
+    dry_run: bool = typer.Option(False, help="Report what would change without writing"),
+):
+    summary = asyncio.run(migrate(batch_size, dry_run))
+    logger.info("Done: %s", summary)
+
+
+if __name__ == "__main__":
+    typer.run(main)
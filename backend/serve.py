@@ -0,0 +1,283 @@
+"""Production entry point: a pre-fork supervisor for N uvicorn workers.
+
+The master binds the listening socket once and forks the workers, which all
+accept from it. Each worker builds its own Mongo client in the app's
+lifespan, warms up (pool, hot reads and a warm-up request sequence) and only
+then starts accepting and tells the master it is ready, so no request ever
+lands on a cold worker.
+
+    SIGHUP           rolling restart: every worker is replaced by a new one
+                     that has finished warming up before the old one drains
+    SIGTERM, SIGINT  drain every worker (stop accepting, finish in-flight
+                     requests, shut down) and exit
+    SIGTTIN/SIGTTOU  add or remove one worker
+
+With --preload the app is imported once in the master, so workers fork in
+milliseconds and share its memory, but a rolling restart keeps running the
+code the master loaded; without it each worker imports the code afresh.
+Prometheus metrics are aggregated across workers through
+PROMETHEUS_MULTIPROC_DIR (a temporary directory unless one is set).
+
+Workers only see their own writes, so the collection version behind the list
+ETags and the dimension cache is kept in Mongo (SHARED_TENDER_VERSION, on
+unless set otherwise). Live updates from other workers' writes reach
+/tenders/stream as they happen with a change stream (a replica set), and
+otherwise as a resync event within a second.
+
+    python serve.py --workers 4 --port 8001
+"""
+import asyncio
+import logging
+import os
+import select
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import typer
+
+logger = logging.getLogger("serve")
+
+
+def default_workers() -> int:
+    """One worker per core this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def prepare_metrics_dir():
+    # Must happen before prometheus_client is first imported; files left by a
+    # previous run would otherwise be added to this run's totals
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="tenders-metrics-")
+        return
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for stale in Path(directory).glob("*.db"):
+        stale.unlink()
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    def __init__(self, sock: socket.socket, options: dict):
+        self.sock = sock
+        self.options = options
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.target = options["workers"]
+        self.signals = []
+
+    # Workers
+    def spawn(self) -> tuple:
+        """Fork a worker; returns its pid and the pipe it reports readiness on."""
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            try:
+                run_worker(self.sock, ready_write, self.options)
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+                os._exit(1)
+            os._exit(0)
+        os.close(ready_write)
+        self.workers[pid] = time.monotonic()
+        return pid, ready_read
+
+    def wait_ready(self, pending: Dict[int, int]) -> Dict[int, bool]:
+        """Wait until every worker in pending (pid -> pipe) reports in, dies or times out."""
+        results = {}
+        deadline = time.monotonic() + self.options["ready_timeout"]
+        while pending and time.monotonic() < deadline:
+            timeout = deadline - time.monotonic()
+            readable, _, _ = select.select(list(pending.values()), [], [], timeout)
+            for pid, fd in list(pending.items()):
+                if fd in readable:
+                    # One byte once ready; end of file if it exited first
+                    results[pid] = os.read(fd, 1) == b"1"
+                    os.close(fd)
+                    del pending[pid]
+        for pid, fd in pending.items():
+            os.close(fd)
+            results[pid] = False
+        for pid, ready in results.items():
+            if ready:
+                logger.info("Worker %d ready", pid)
+            else:
+                logger.error("Worker %d did not become ready", pid)
+                self.stop(pid, signal.SIGKILL)
+        return results
+
+    def start(self, count: int) -> bool:
+        pending = dict(self.spawn() for _ in range(count))
+        return all(self.wait_ready(pending).values())
+
+    def stop(self, pid: int, signum: int = signal.SIGTERM):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self) -> list:
+        """Collect exited workers and return their pids."""
+        # Imported late: PROMETHEUS_MULTIPROC_DIR has to be set first
+        from prometheus_client import multiprocess
+
+        exited = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if self.workers.pop(pid, None) is not None:
+                exited.append(pid)
+                # Drops the live gauges of the worker from the aggregate
+                multiprocess.mark_process_dead(pid)
+                if status:
+                    logger.warning("Worker %d exited with status %d", pid,
+                                   os.waitstatus_to_exitcode(status))
+        return exited
+
+    # Master
+    def rolling_restart(self):
+        logger.info("Replacing %d workers", len(self.workers))
+        for old in list(self.workers):
+            if not self.start(1):
+                logger.error("Restart aborted; the remaining workers keep serving")
+                return
+            # The new worker is accepting, so the old one can drain
+            self.stop(old)
+
+    def drain(self):
+        logger.info("Draining %d workers", len(self.workers))
+        for pid in self.workers:
+            self.stop(pid)
+        deadline = time.monotonic() + self.options["graceful_timeout"] + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            logger.warning("Worker %d did not drain in time", pid)
+            self.stop(pid, signal.SIGKILL)
+        self.reap()
+
+    def run(self) -> int:
+        handled = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU)
+        for signum in handled:
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+        if not self.start(self.target):
+            logger.error("Workers failed to start")
+            self.drain()
+            return 1
+        logger.info("Serving on %s with %d workers", self.sock.getsockname(), len(self.workers))
+        while True:
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.drain()
+                    return 0
+                if signum == signal.SIGHUP:
+                    self.rolling_restart()
+                elif signum == signal.SIGTTIN:
+                    self.target += 1
+                elif signum == signal.SIGTTOU and self.target > 1:
+                    self.target -= 1
+                    self.stop(min(self.workers, key=self.workers.get))
+            self.reap()
+            if len(self.workers) < self.target and not self.signals:
+                # A crashed worker is replaced, but not in a tight loop
+                started = self.start(self.target - len(self.workers))
+                if not started:
+                    time.sleep(1)
+            time.sleep(0.2)
+
+
+def run_worker(sock: socket.socket, ready_fd: int, options: dict):
+    import uvicorn
+
+    # Only the master handles these; uvicorn installs its own SIGINT/SIGTERM
+    for signum in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(signum, signal.SIG_IGN)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    if options["preload"]:
+        from server import app
+    else:
+        app = "server:app"
+    config = uvicorn.Config(
+        app,
+        log_level=options["log_level"],
+        access_log=options["access_log"],
+        proxy_headers=options["proxy_headers"],
+        forwarded_allow_ips=options["forwarded_allow_ips"],
+        timeout_keep_alive=options["keep_alive"],
+        timeout_graceful_shutdown=options["graceful_timeout"],
+    )
+    server = uvicorn.Server(config)
+
+    async def serve():
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        # started is set once the lifespan (client, indexes, warm-up) has
+        # finished and the socket is being accepted on
+        while not server.started and not serving.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            os.write(ready_fd, b"1")
+        os.close(ready_fd)
+        await serving
+
+    config.setup_event_loop()
+    asyncio.run(serve())
+
+
+def main(
+    host: str = typer.Option("0.0.0.0", help="Interface to bind"),
+    port: int = typer.Option(8001, help="Port to bind"),
+    workers: int = typer.Option(default_workers(), min=1,
+                                help="Worker processes; defaults to the usable cores"),
+    preload: bool = typer.Option(True, help="Import the app once in the master before forking"),
+    ready_timeout: float = typer.Option(
+        60, help="Seconds a worker may take to connect and warm up"),
+    graceful_timeout: int = typer.Option(
+        30, help="Seconds a draining worker may spend finishing requests"),
+    keep_alive: int = typer.Option(5, help="Seconds idle keep-alive connections are kept open"),
+    backlog: int = typer.Option(2048, help="Listen backlog of the shared socket"),
+    proxy_headers: bool = typer.Option(True, help="Trust X-Forwarded-* from --forwarded-allow-ips"),
+    forwarded_allow_ips: str = typer.Option(
+        "127.0.0.1", help="Proxies whose X-Forwarded-* headers are trusted"),
+    log_level: str = typer.Option("info", help="Log level of the master and the workers"),
+    access_log: bool = typer.Option(False, help="Log every request"),
+):
+    logging.basicConfig(level=log_level.upper(),
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    prepare_metrics_dir()
+    # Read when server is imported, here or in the workers
+    os.environ.setdefault("SHARED_TENDER_VERSION", "1")
+    if preload:
+        import server  # noqa: F401
+    sock = bind_socket(host, port, backlog)
+    options = {
+        "workers": workers, "preload": preload, "ready_timeout": ready_timeout,
+        "graceful_timeout": graceful_timeout, "keep_alive": keep_alive,
+        "proxy_headers": proxy_headers, "forwarded_allow_ips": forwarded_allow_ips,
+        "log_level": log_level, "access_log": access_log,
+    }
+    raise typer.Exit(Supervisor(sock, options).run())
+
+
+if __name__ == "__main__":
+    typer.run(main)
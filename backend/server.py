@@ -1,26 +1,411 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import (
+    FastAPI, APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response,
+)
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT, DeleteOne, IndexModel, InsertOne, ReturnDocument, UpdateOne
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+    multiprocess,
+)
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from functools import lru_cache
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+try:
+    import orjson
+except ImportError:  # optional: pydantic-core's encoder is used instead
+    orjson = None
+try:
+    import xlsxwriter
+except ImportError:  # optional: only XLSX export needs it
+    xlsxwriter = None
+try:
+    import openpyxl
+except ImportError:  # optional: only XLSX import needs it
+    openpyxl = None
+from collections import deque
+from itertools import islice
+import asyncio
+import base64
+import csv
+import io
+import json
+import secrets
+import sys
+import tempfile
+import threading
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta, timezone
 from enum import Enum
+from time import perf_counter
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Metrics: request counts, latencies and response sizes per route template,
+# plus Mongo command latencies per collection and connection-pool checkouts
+# from PyMongo's monitoring events, so time spent in the API can be told apart
+# from time spent in the database. Workers started with
+# PROMETHEUS_MULTIPROC_DIR set report their aggregate on /metrics.
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = tuple(4 ** n for n in range(4, 13))  # 256 B to 16 MB
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled",
+                        ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds",
+                         "Time until the last byte of the response was sent",
+                         ["method", "route"], buckets=LATENCY_BUCKETS)
+HTTP_RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body size",
+                               ["method", "route"], buckets=SIZE_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled",
+                       multiprocess_mode="livesum")
+MONGO_COMMAND_LATENCY = Histogram("mongo_command_duration_seconds", "Mongo command round-trip time",
+                                  ["command", "collection"], buckets=LATENCY_BUCKETS)
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "Mongo commands that failed",
+                                 ["command", "collection"])
+MONGO_POOL_CHECKOUTS = Counter("mongo_pool_checkouts_total",
+                               "Connection checkouts from the Mongo pool", ["outcome"])
+MONGO_POOL_CHECKED_OUT = Gauge("mongo_pool_connections_checked_out", "Mongo connections in use",
+                               multiprocess_mode="livesum")
+MONGO_POOL_CONNECTIONS = Gauge("mongo_pool_connections", "Open Mongo connections",
+                               multiprocess_mode="livesum")
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        # Only the started event carries the command, so the collection is
+        # remembered until the matching succeeded/failed event
+        self._collections = {}
+
+    def started(self, event):
+        name = "collection" if event.command_name == "getMore" else event.command_name
+        collection = event.command.get(name)
+        if not isinstance(collection, str):
+            collection = ""
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        duration = event.duration_micros / 1e6
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(duration)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        duration = event.duration_micros / 1e6
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(duration)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        # This process's pool, reported by /api/ready
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+        MONGO_POOL_CHECKOUTS.labels("ok").inc()
+        MONGO_POOL_CHECKED_OUT.inc()
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+        MONGO_POOL_CHECKOUTS.labels(event.reason).inc()
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def connection_created(self, event):
+        self.open += 1
+        MONGO_POOL_CONNECTIONS.inc()
+
+    def connection_closed(self, event):
+        self.open -= 1
+        MONGO_POOL_CONNECTIONS.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+class MetricsMiddleware:
+    """Record per-route HTTP metrics; plain ASGI so streamed bodies are
+    measured until their last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = perf_counter()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The route template keeps label cardinality bounded
+            route = scope.get("route")
+            path = route.path if route else "unmatched"
+            HTTP_REQUESTS.labels(scope["method"], path, status).inc()
+            HTTP_LATENCY.labels(scope["method"], path).observe(perf_counter() - started)
+            HTTP_RESPONSE_SIZE.labels(scope["method"], path).observe(size)
+
+# Request timing: handlers time their phases (Mongo fetch, document decoding,
+# JSON encoding) into the request's timings, which are sent back in a
+# Server-Timing header. "app" is the rest of the time to the response headers:
+# routing and, on the default path, response_model validation and encoding.
+request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def server_timing(phase: str):
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings.get()
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + perf_counter() - started
+
+def format_server_timing(timings: dict, total: float) -> str:
+    phases = dict(timings, app=max(total - sum(timings.values()), 0.0), total=total)
+    return ", ".join(f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in phases.items())
+
+# On-demand profiling: an allowlisted route requested with "X-Profile: 1" and
+# a valid X-Admin-Token runs while a sampler thread records the event loop's
+# stack. The folded stacks (flamegraph.pl / speedscope format) are kept for
+# the last PROFILE_HISTORY requests and served by /api/admin/profiles. Other
+# requests running on the loop at the same time show up in the samples too.
+PROFILE_ROUTES = {
+    route.strip() for route in os.environ.get(
+        'PROFILE_ROUTES',
+        '/api/tenders,/api/tenders/{tender_id},/api/tenders/next-due,'
+        '/api/tenders/expiring,/api/tenders/timeline',
+    ).split(',') if route.strip()
+}
+PROFILE_SAMPLE_INTERVAL = 0.001
+PROFILE_HISTORY = 20
+
+class SamplingProfiler:
+    def __init__(self, route: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.route = route
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.samples = {}
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample, name=f"profiler-{self.id}", daemon=True
+        )
+
+    def _sample(self):
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                location = f"{Path(code.co_filename).name}:{code.co_firstlineno}"
+                stack.append(f"{code.co_name} ({location})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def start(self) -> "SamplingProfiler":
+        # The sampler needs the GIL at least once per interval, not only at
+        # the default 5 ms thread switch
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(PROFILE_SAMPLE_INTERVAL / 2)
+        self._thread.start()
+        return self
+
+    def stop(self, duration: float) -> dict:
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+        return {
+            "id": self.id,
+            "route": self.route,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 2),
+            "samples": sum(self.samples.values()),
+            "folded": "\n".join(
+                f"{stack} {count}" for stack, count in sorted(self.samples.items())
+            ),
+        }
+
+recent_profiles = deque(maxlen=PROFILE_HISTORY)
+profiler_lock = threading.Lock()
+
+def start_profiler(scope) -> Optional[SamplingProfiler]:
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile") != b"1" or not ADMIN_TOKEN:
+        return None
+    # Raw bytes: any header value, decodable or not, is simply not the token
+    if not secrets.compare_digest(headers.get(b"x-admin-token", b""), ADMIN_TOKEN.encode()):
+        return None
+    route = next(
+        (route.path for route in app.router.routes if route.matches(scope)[0] == Match.FULL),
+        None,
+    )
+    # One profile at a time: concurrent samplers would only see each other
+    if route not in PROFILE_ROUTES or not profiler_lock.acquire(blocking=False):
+        return None
+    return SamplingProfiler(route, scope["path"]).start()
+
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = {}
+        token = request_timings.set(timings)
+        profiler = start_profiler(scope)
+        started = perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                timing = format_server_timing(timings, perf_counter() - started)
+                headers.append("Server-Timing", timing)
+                if profiler:
+                    headers.append("X-Profile-Id", profiler.id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            if profiler:
+                recent_profiles.append(profiler.stop(perf_counter() - started))
+                profiler_lock.release()
+
+# Storage: MongoDB through Motor, or (STORAGE_BACKEND=embedded, for the
+# desktop build) the SQLite engine in embedded_db.py, which implements the
+# part of the Motor API used here so no database process has to be started
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+if STORAGE_BACKEND == 'embedded':
+    from embedded_db import EmbeddedClient
+
+# Mongo connection pool and timeouts. MONGO_COMPRESSORS (e.g.
+# "zstd,snappy,zlib") turns on wire compression, worth it for remote clusters
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 10))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 0))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+
+mongo_pool = MongoPoolMetrics()
+
+# The client is created by the app's lifespan (scripts call connect()), in the
+# process and event loop that use it, so forked workers never share one
+client = None
+db = None
+
+def create_client():
+    if STORAGE_BACKEND == 'embedded':
+        return EmbeddedClient(os.environ.get('EMBEDDED_DATA_DIR', ROOT_DIR / 'data'))
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    listeners = [MongoCommandMetrics(), mongo_pool]
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=listeners, **options)
+
+def connect():
+    global client, db
+    client = create_client()
+    db = client[os.environ['DB_NAME']]
+    return db
+
+def disconnect():
+    global client, db
+    if client is not None:
+        client.close()
+    client = db = None
+
+# Opt-in fast JSON path: tender routes skip response_model revalidation and
+# FastAPI's jsonable_encoder and encode the codec payloads directly
+FAST_JSON = os.environ.get('FAST_JSON', '').lower() in ('1', 'true', 'yes')
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A client injected before startup (tests, benchmarks) is kept
+    if db is None:
+        connect()
+    app.state.ready = False
+    # Per process: with serve.py --preload the module was imported before fork
+    await tender_version.start()
+    change_feed.start()
+    await ensure_indexes()
+    await seed_dimensions()
+    app.state.change_stream_task = asyncio.create_task(watch_tender_changes())
+    app.state.version_counter_task = asyncio.create_task(watch_version_counter())
+    await warm_up(app)
+    app.state.ready = True
+    yield
+    # Fail readiness first so the balancer drains this worker
+    app.state.ready = False
+    app.state.change_stream_task.cancel()
+    app.state.version_counter_task.cancel()
+    for task in import_tasks:
+        task.cancel()
+    await asyncio.gather(*import_tasks, return_exceptions=True)
+    disconnect()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -57,6 +442,8 @@ class Tender(BaseModel):
     assigned_sales_rep: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped by every update; send it back in If-Match to detect lost updates
+    version: int = 1
 
 class TenderCreate(BaseModel):
     item: str
@@ -82,33 +469,1096 @@ class TenderUpdate(BaseModel):
     priority: Optional[PriorityLevel] = None
     assigned_sales_rep: Optional[str] = None
 
+class TimelineBounds(BaseModel):
+    min_date: Optional[date] = None
+    max_date: Optional[date] = None
+    truncated: bool = False
+
+class TenderTimeline(TimelineBounds):
+    tenders: List[Tender]
+
+class TenderBulkUpdate(TenderUpdate):
+    id: str
+
+# Bulk items are validated one by one so a bad row is reported, not fatal
+class TenderBulkRequest(BaseModel):
+    create: List[Dict[str, Any]] = []
+    update: List[Dict[str, Any]] = []
+    delete: List[str] = []
+
+class TenderBulkItemResult(BaseModel):
+    op: str
+    index: int
+    id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+class TenderBulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    results: List[TenderBulkItemResult]
+
+class TenderImportRowError(BaseModel):
+    row: int
+    error: str
+
+class TenderImportJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"  # queued, running, completed or failed
+    format: str
+    rows: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[TenderImportRowError] = []
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Indexes backing every query issued by the tender routes
+TENDER_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+    IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+               name="status_created_at_id"),
+    IndexModel([("priority", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+               name="priority_created_at_id"),
+    IndexModel([("customer", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+               name="customer_created_at_id"),
+    IndexModel([("due_date", ASCENDING)], name="due_date"),
+    IndexModel([("start_date", ASCENDING), ("expiry_date", ASCENDING)],
+               name="start_date_expiry_date"),
+    IndexModel([("expiry_date", ASCENDING)], name="expiry_date"),
+    # Whole-word search; no stemming, so codes and names match as typed
+    IndexModel(
+        [("tender_name", TEXT), ("customer", TEXT), ("item", TEXT)],
+        name="tender_text",
+        weights={"tender_name": 3, "customer": 2, "item": 1},
+        default_language="none",
+    ),
+]
+
+DIMENSION_INDEXES = [
+    IndexModel([("dimension", ASCENDING), ("value", ASCENDING)], name="dimension_value",
+               unique=True),
+    IndexModel([("dimension", ASCENDING), ("key", ASCENDING)], name="dimension_key"),
+]
+
+# Append-only status transitions; one index per analytics query shape
+STATUS_HISTORY_INDEXES = [
+    IndexModel([("tender_id", ASCENDING), ("at", ASCENDING)], name="tender_id_at"),
+    IndexModel([("from_status", ASCENDING), ("at", ASCENDING), ("to_status", ASCENDING),
+                ("duration", ASCENDING)], name="from_status_at_to_status_duration"),
+    IndexModel([("to_status", ASCENDING), ("at", ASCENDING)], name="to_status_at"),
+]
+
+IMPORT_JOB_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+]
+
+COLLECTION_INDEXES = {
+    "tenders": TENDER_INDEXES,
+    "tender_dimensions": DIMENSION_INDEXES,
+    "tender_status_history": STATUS_HISTORY_INDEXES,
+    "import_jobs": IMPORT_JOB_INDEXES,
+}
+
+async def ensure_indexes():
+    for collection, indexes in COLLECTION_INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as exc:
+            # e.g. duplicate ids blocking the unique index; keep serving and
+            # let the index advisor report what is missing
+            logger.error("Could not create %s indexes: %s", collection, exc)
+
+def plan_stages(plan: dict) -> List[str]:
+    """Flatten an explain() plan tree into the list of its stage names."""
+    stages = []
+    if plan.get("stage"):
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+def route_query_explains():
+    """Explain commands for the queries the tender routes run, keyed by route."""
+    def find(query, sort=TENDER_SORT, limit=DEFAULT_PAGE_SIZE + 1, collection="tenders"):
+        command = {"find": collection, "filter": query, "limit": limit}
+        if sort:
+            command["sort"] = dict(sort)
+        return command
+    now = datetime.utcnow()
+    return {
+        "GET /tenders": find({}),
+        "GET /tenders?status=": find({"status": TenderStatus.OFFER.value}),
+        "GET /tenders?priority=": find({"priority": PriorityLevel.HIGH.value}),
+        "GET /tenders?customer=": find({"customer": ""}),
+        "GET /tenders/{id}": find({"id": ""}, sort=None, limit=1),
+        "GET /tenders/timeline": find({"start_date": {"$lte": now}, "expiry_date": {"$gte": now}},
+                                      sort=[("start_date", 1)], limit=MAX_PAGE_SIZE + 1),
+        "GET /tenders/next-due": find({"due_date": {"$gt": now}}, sort=[("due_date", 1)], limit=1),
+        "GET /tenders/filters/*": find({}, sort=[("dimension", 1), ("value", 1)], limit=0,
+                                       collection="tender_dimensions"),
+        "GET /tenders/filters/*/autocomplete": find(
+            {"dimension": "customer", "key": {"$gte": "a", "$lt": "b"}},
+            sort=[("dimension", 1), ("key", 1)], limit=10, collection="tender_dimensions",
+        ),
+        "GET /analytics/stage-durations": find(
+            {"from_status": {"$in": STATUS_VALUES}, "at": {"$gte": now}},
+            sort=None, limit=0, collection="tender_status_history",
+        ),
+        "GET /analytics/win-rates": find(
+            {"to_status": {"$in": OUTCOME_STATUSES}, "at": {"$gte": now}},
+            sort=None, limit=0, collection="tender_status_history",
+        ),
+    }
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    # Header values arrive decoded as latin-1; compare the original bytes, so
+    # non-ASCII tokens neither crash compare_digest nor match by accident
+    token = (x_admin_token or "").encode("latin-1")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# Keyset pagination over the stable (created_at, id) sort key
+TENDER_SORT = [("created_at", 1), ("id", 1)]
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(tender: dict) -> str:
+    payload = json.dumps([tender['created_at'].isoformat(), tender['id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Turn an opaque cursor back into a query matching the rows after it."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, tender_id = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "id": {"$gt": tender_id}},
+    ]}
+
+# Date storage: BSON has no plain date type, so calendar dates are stored as
+# UTC midnight datetimes and every date field is a native, range-queryable date
+DATE_FIELDS = ('start_date', 'expiry_date')
+DATETIME_FIELDS = ('due_date',)
+
+def dates_to_bson(data: dict) -> dict:
+    for field in DATE_FIELDS:
+        if isinstance(data.get(field), date) and not isinstance(data[field], datetime):
+            data[field] = datetime.combine(data[field], time.min)
+    return data
+
+def decode_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        # Legacy ISO string not yet rewritten by migrate_dates.py
+        return datetime.fromisoformat(value).date()
+    return value
+
+def decode_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    # Mongo hands back naive UTC datetimes; the API always sends an offset
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def decode_version(value):
+    # Tenders written before versioning have none and count as version 0
+    return value or 0
+
+# Document codec: the values in Mongo were validated when this API wrote
+# them, so turning a document into an API payload is one pass that only fixes
+# BSON types (dates stored as datetimes, legacy ISO strings) instead of a
+# second full Pydantic validation
+FIELD_DECODERS = {
+    'start_date': decode_date,
+    'expiry_date': decode_date,
+    'due_date': decode_datetime,
+    'version': decode_version,
+}
+
+@lru_cache(maxsize=256)
+def payload_decoders(fields: Optional[FrozenSet[str]] = None) -> tuple:
+    return tuple(
+        (name, FIELD_DECODERS.get(name))
+        for name in Tender.model_fields
+        if fields is None or name in fields
+    )
+
+def tender_payload(tender: dict, fields: Optional[FrozenSet[str]] = None) -> dict:
+    """Build the API representation of a stored tender, optionally sparse."""
+    payload = {}
+    for name, decoder in payload_decoders(fields):
+        value = tender.get(name)
+        payload[name] = decoder(value) if decoder else value
+    return payload
+
+# orjson (or, without it, pydantic-core) encodes dates, datetimes and str
+# enums natively
+encode_json = orjson.dumps if orjson else TypeAdapter(Any).dump_json
+
+def json_response(content, headers: Optional[dict] = None) -> Response:
+    """Send already-trusted payloads without going through a response_model."""
+    with server_timing("encode"):
+        body = encode_json(content)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Sparse fieldsets: ?fields=a,b,c is pushed down to Mongo as a projection and
+# only those fields are decoded and serialised
+def parse_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - Tender.model_fields.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # The id is always returned so partial rows can still be addressed
+    return frozenset(requested | {"id"})
+
+def tender_projection(fields: FrozenSet[str]) -> dict:
+    # created_at is needed to build the next page's cursor
+    projection = {name: 1 for name in fields | {"created_at"}}
+    projection["_id"] = 0
+    return projection
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """The tender version an If-Match header expects; None when any will do."""
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a tender version")
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+def version_conflict(version: int) -> HTTPException:
+    return HTTPException(status_code=409,
+                         detail=f"Tender was modified; the current version is {version}",
+                         headers={"ETag": version_etag(version)})
+
+async def apply_tender_update(tender_id: str, update_data: dict,
+                              version: Optional[int] = None) -> dict:
+    """Apply a $set to one tender in a single round trip and return its payload.
+
+    With a version the write only happens if the tender is still at it (409
+    otherwise). The pre-image feeds the dimensions and status history; the new
+    document is derived from it, so no second read is needed.
+    """
+    query = {"id": tender_id}
+    if version is not None:
+        # Matches a missing field too, for tenders from before versioning
+        query["version"] = version or None
+    update = {"$set": update_data, "$inc": {"version": 1}}
+    before = await db.tenders.find_one_and_update(query, update)
+    if before is None:
+        current = None
+        if version is not None:
+            current = await db.tenders.find_one({"id": tender_id}, {"version": 1})
+        if current:
+            raise version_conflict(decode_version(current.get("version")))
+        raise HTTPException(status_code=404, detail="Tender not found")
+    after = {**before, **update_data, "version": decode_version(before.get("version")) + 1}
+    await record_tender_changes([(before, after)])
+    
+    updated_tender = tender_payload(after)
+    change_feed.publish_local("update", tender_id, updated_tender)
+    return updated_tender
+
+def update_to_document(tender_update: TenderUpdate) -> dict:
+    """Build the $set document for a partial update; unset fields are left alone."""
+    update_data = {k: v for k, v in tender_update.dict().items() if v is not None}
+    update_data.pop('id', None)
+    dates_to_bson(update_data)
+    update_data['updated_at'] = datetime.utcnow()
+    return update_data
+
+# Streaming modes (NDJSON, and the unpaged JSON array) for the tender list
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+async def stream_tenders_ndjson(
+    query: dict,
+    limit: Optional[int] = None,
+    fields: Optional[FrozenSet[str]] = None
+):
+    """Yield one JSON line per tender straight off the Motor cursor.
+
+    Only a single cursor batch is held in memory at a time, so the worker's
+    footprint does not grow with the size of the result.
+    """
+    async for tender in tender_cursor(query, fields, limit):
+        yield encode_json(tender_payload(tender, fields)) + b"\n"
+
+async def stream_tenders_json(query: dict, fields: Optional[FrozenSet[str]] = None):
+    """Yield one JSON array of every matching tender, a cursor batch at a time."""
+    opening = b"["
+    batch = []
+    async for tender in tender_cursor(query, fields):
+        batch.append(encode_json(tender_payload(tender, fields)))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield opening + b",".join(batch)
+            opening = b","
+            batch = []
+    if batch:
+        yield opening + b",".join(batch)
+        opening = b","
+    yield b"]" if opening == b"," else b"[]"
+
+def tender_cursor(query: dict, fields: Optional[FrozenSet[str]] = None,
+                  limit: Optional[int] = None):
+    """Cursor over every matching tender in list order, fetched a batch at a time."""
+    projection = tender_projection(fields) if fields else None
+    cursor = db.tenders.find(query, projection).sort(TENDER_SORT).batch_size(STREAM_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+# Export: CSV is streamed straight off the cursor; XLSX, a zip that cannot be
+# sent before it is complete, is written row by row in XlsxWriter's
+# constant_memory mode to a temporary file. Memory stays flat either way.
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+EXPORT_CHUNK_SIZE = 64 * 1024
+XLSX_MAX_ROWS = 1048575  # Excel's limit, less the header row
+# Text starting with one of these is run as a formula by spreadsheet apps
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+async def stream_tenders_csv(query: dict, fields: Optional[FrozenSet[str]], columns: List[str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # The BOM makes Excel open the file as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    async for tender in tender_cursor(query, fields):
+        payload = tender_payload(tender, fields)
+        writer.writerow([csv_cell(payload[column]) for column in columns])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def write_tenders_xlsx(query: dict, fields: Optional[FrozenSet[str]],
+                             columns: List[str]) -> str:
+    """Write the matching tenders to a temporary .xlsx file and return its path."""
+    output = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    output.close()
+    # User text is always written as text, never as a formula or a link; the
+    # UTC due dates are written without their offset, which Excel cannot hold
+    workbook = xlsxwriter.Workbook(output.name, {
+        "constant_memory": True, "strings_to_formulas": False, "strings_to_urls": False,
+        "remove_timezone": True,
+    })
+    worksheet = workbook.add_worksheet("Tenders")
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    datetime_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm"})
+
+    def write_date(row: int, col: int, value):
+        worksheet.write_datetime(row, col, value, date_format)
+
+    def write_datetime(row: int, col: int, value):
+        worksheet.write_datetime(row, col, value, datetime_format)
+
+    writers = []
+    for column in columns:
+        if column in DATE_FIELDS:
+            writers.append(write_date)
+        elif column in DATETIME_FIELDS or column in ("created_at", "updated_at"):
+            writers.append(write_datetime)
+        else:
+            writers.append(worksheet.write)
+
+    def write_rows(first_row: int, rows: List[dict]):
+        for row, payload in enumerate(rows, first_row):
+            for col, (column, write) in enumerate(zip(columns, writers)):
+                if payload[column] is not None:
+                    write(row, col, payload[column])
+
+    try:
+        worksheet.write_row(0, 0, columns)
+        rows = []
+        written = 0
+        async for tender in tender_cursor(query, fields, XLSX_MAX_ROWS):
+            rows.append(tender_payload(tender, fields))
+            if len(rows) == STREAM_BATCH_SIZE:
+                # Cell writes are blocking work; keep them off the event loop
+                await asyncio.to_thread(write_rows, written + 1, rows)
+                written += len(rows)
+                rows = []
+        await asyncio.to_thread(write_rows, written + 1, rows)
+        await asyncio.to_thread(workbook.close)
+    except BaseException:
+        os.unlink(output.name)
+        raise
+    return output.name
+
+# Import: the upload is spooled to a temporary file as it arrives, then read,
+# validated against TenderCreate and written IMPORT_CHUNK_SIZE rows at a time
+# with one unordered insert_many per chunk. Progress and row errors live on
+# the job document, so any worker can answer for a job.
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', 100 * 1024 * 1024))
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 1))
+IMPORT_MAX_ERRORS = 1000  # row errors kept per job; the rest are only counted
+IMPORT_REQUIRED_COLUMNS = frozenset(
+    name for name, field in TenderCreate.model_fields.items() if field.is_required()
+)
+IMPORT_TEXT_COLUMNS = frozenset(
+    name for name, field in TenderCreate.model_fields.items() if field.annotation is str
+)
+
+import_slots = asyncio.Semaphore(IMPORT_CONCURRENCY)
+import_tasks = set()
+
+async def spool_upload(request: Request, suffix: str) -> str:
+    """Copy the request body to a temporary file and return its path."""
+    if int(request.headers.get("content-length") or 0) > IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413,
+                            detail=f"Uploads are limited to {IMPORT_MAX_BYTES} bytes")
+    output = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    size = 0
+    try:
+        with output:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413,
+                                        detail=f"Uploads are limited to {IMPORT_MAX_BYTES} bytes")
+                output.write(chunk)
+    except BaseException:
+        os.unlink(output.name)
+        raise
+    return output.name
+
+def read_csv_rows(path: str):
+    with open(path, newline="", encoding="utf-8-sig") as source:
+        yield from csv.reader(source)
+
+def read_xlsx_rows(path: str):
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def import_column(header) -> str:
+    # "Tender Name" and "tender_name" both map to the field
+    return str(header or "").strip().lower().replace(" ", "_")
+
+def validate_import_rows(rows: List[tuple], columns: List[str],
+                         first_row: int) -> Tuple[List[tuple], List[dict]]:
+    """Split a chunk of rows into (row number, document) pairs and row errors."""
+    valid = []
+    errors = []
+    for row_number, row in enumerate(rows, first_row):
+        data = {}
+        for column, value in zip(columns, row):
+            # Blank cells count as missing, so defaults apply
+            if value is None or value == "":
+                continue
+            if column in IMPORT_TEXT_COLUMNS and not isinstance(value, str):
+                # Spreadsheets store numeric codes and names as numbers
+                value = str(value)
+            data[column] = value
+        if not data:
+            continue
+        try:
+            tender_obj = Tender(**TenderCreate(**data).model_dump())
+        except ValidationError as exc:
+            errors.append({"row": row_number, "error": validation_message(exc)})
+            continue
+        valid.append((row_number, dates_to_bson(tender_obj.dict())))
+    return valid, errors
+
+async def insert_import_rows(valid: List[tuple], errors: List[dict]) -> List[dict]:
+    """Insert a validated chunk and return the documents that were written."""
+    documents = [document for _, document in valid]
+    if not documents:
+        return []
+    rejected = set()
+    try:
+        await db.tenders.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get("writeErrors", []):
+            rejected.add(error["index"])
+            errors.append({"row": valid[error["index"]][0], "error": error.get("errmsg")})
+    return [document for index, document in enumerate(documents) if index not in rejected]
+
+async def update_import_job(job_id: str, **fields):
+    fields["updated_at"] = datetime.utcnow()
+    await db.import_jobs.update_one({"id": job_id}, {"$set": fields})
+
+async def run_import(job_id: str, path: str, file_format: str):
+    rows = read_xlsx_rows(path) if file_format == "xlsx" else read_csv_rows(path)
+    progress = {"rows": 0, "inserted": 0, "failed": 0, "errors": []}
+    try:
+        async with import_slots:
+            await update_import_job(job_id, status="running")
+            header = await asyncio.to_thread(next, rows, None)
+            columns = [import_column(name) for name in header or ()]
+            missing = IMPORT_REQUIRED_COLUMNS.difference(columns)
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+            while True:
+                chunk = await asyncio.to_thread(lambda: list(islice(rows, IMPORT_CHUNK_SIZE)))
+                if not chunk:
+                    break
+                # Row 1 is the header
+                first_row = progress["rows"] + 2
+                valid, errors = await asyncio.to_thread(validate_import_rows, chunk, columns,
+                                                        first_row)
+                inserted = await insert_import_rows(valid, errors)
+                if inserted:
+                    await record_tender_changes([(None, document) for document in inserted])
+                    # One refetch per chunk instead of an event per row
+                    change_feed.publish_local("resync", None)
+                progress["rows"] += len(chunk)
+                progress["inserted"] += len(inserted)
+                progress["failed"] += len(errors)
+                errors.sort(key=lambda error: error["row"])
+                progress["errors"].extend(errors[:IMPORT_MAX_ERRORS - len(progress["errors"])])
+                await update_import_job(job_id, **progress)
+        await update_import_job(job_id, status="completed")
+    except asyncio.CancelledError:
+        await update_import_job(job_id, status="failed", error="Interrupted by shutdown")
+        raise
+    except Exception as exc:
+        logger.warning("Import %s failed: %s", job_id, exc)
+        await update_import_job(job_id, status="failed", error=str(exc) or type(exc).__name__)
+    finally:
+        rows.close()
+        os.unlink(path)
+
+# Change feed: every tender insert, update and delete is fanned out to the
+# /tenders/stream subscribers of this worker. With a replica set the events
+# come from a Mongo change stream, so writes made by other workers and
+# processes are seen too; otherwise the write handlers publish them directly.
+# Collection version: bumped on every tender write seen by this worker and
+# used as the ETag of the list and filter endpoints, so unchanged data is
+# answered with 304 before Mongo is touched. The epoch is picked in the
+# lifespan, after any fork, and changes on restart so a counter reset never
+# produces a false match.
+# Several workers (serve.py, uvicorn --workers) cannot see each other's
+# writes, so with SHARED_TENDER_VERSION the version is a counter document in
+# Mongo instead: every write increments it once its rollups are applied and
+# every conditional read fetches it, one _id lookup, before answering.
+# Without it the document still records dimension rebuilds, which may run in
+# another process (migrate_dates.py), and each worker polls it for them.
+SHARED_TENDER_VERSION = os.environ.get('SHARED_TENDER_VERSION', '').lower() in ('1', 'true', 'yes')
+SHARED_VERSION_ID = "tenders"
+SHARED_VERSION_POLL_SECONDS = 1
+
+class CollectionVersion:
+    def __init__(self, shared: bool = False):
+        self.shared = shared
+        self.epoch = None
+        self.value = 0
+        # Shared counter values produced by this worker's own writes
+        self.own = set()
+
+    async def start(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.value = 0
+        if self.shared:
+            await db.counters.update_one(
+                {"_id": SHARED_VERSION_ID},
+                {"$setOnInsert": {"epoch": self.epoch, "value": 0}},
+                upsert=True,
+            )
+            await self.refresh()
+
+    def bump(self):
+        # A shared version only moves through advance()
+        if not self.shared:
+            self.value += 1
+
+    async def advance(self, persist: bool = False):
+        """Count one applied write; in the counter document when the version
+        is shared or when persist asks for other processes to notice it."""
+        if self.shared or persist:
+            counter = await db.counters.find_one_and_update(
+                {"_id": SHARED_VERSION_ID},
+                {"$inc": {"value": 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+            if self.shared:
+                self.own.add(counter["value"])
+        self.bump()
+
+    async def refresh(self):
+        if not self.shared:
+            return
+        counter = await db.counters.find_one({"_id": SHARED_VERSION_ID})
+        if counter:
+            self.epoch, self.value = counter["epoch"], counter["value"]
+
+    async def current_etag(self) -> str:
+        await self.refresh()
+        return self.etag
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self.epoch}-{self.value}"'
+
+tender_version = CollectionVersion(SHARED_TENDER_VERSION)
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response when the client's If-None-Match is still current."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
+
+def cache_headers(etag: str) -> dict:
+    # no-cache makes browsers revalidate every time, which is cheap with a 304.
+    # The list is JSON or NDJSON depending on Accept, so caches must key on it
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+SSE_KEEPALIVE_SECONDS = 15
+FEED_REPLAY_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+class TenderChangeFeed:
+    def __init__(self):
+        self.from_change_stream = False
+        # Event ids are "<origin>-<seq>": the sequence only means something
+        # to the worker process that numbered it
+        self.origin = None
+        self.sequence = 0
+        self._recent = deque(maxlen=FEED_REPLAY_SIZE)
+        self._subscribers = set()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def publish(self, op: str, tender_id: str, tender: Optional[dict] = None):
+        tender_version.bump()
+        self.sequence += 1
+        event = {"seq": self.sequence, "op": op, "id": tender_id, "tender": tender}
+        self._recent.append(event)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A subscriber that cannot keep up is told to refetch instead
+                # of holding an unbounded backlog
+                queue.get_nowait()
+                queue.put_nowait({"seq": self.sequence, "op": "resync", "id": None, "tender": None})
+
+    def publish_local(self, op: str, tender_id: str, tender: Optional[dict] = None):
+        """Publish a write made by this worker, unless the change stream will."""
+        if self.from_change_stream:
+            # The stream event arrives later; bump now so this worker never
+            # answers 304 for data it has just changed
+            tender_version.bump()
+        else:
+            self.publish(op, tender_id, tender)
+
+    def start(self):
+        self.origin = uuid.uuid4().hex[:8]
+
+    def last_sequence(self, last_event_id: Optional[str]) -> Optional[int]:
+        """The sequence a Last-Event-ID resumes from; -1, which always means a
+        resync, when it was numbered by another worker or before a restart."""
+        if not last_event_id:
+            return None
+        origin, _, seq = last_event_id.rpartition("-")
+        return int(seq) if origin == self.origin and seq.isdigit() else -1
+
+    def subscribe(self, last_seq: Optional[int] = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if last_seq is not None and last_seq < self.sequence:
+            missed = [event for event in self._recent if event["seq"] > last_seq]
+            if len(missed) < self.sequence - last_seq:
+                missed = [{"seq": self.sequence, "op": "resync", "id": None, "tender": None}]
+            for event in missed[-SUBSCRIBER_QUEUE_SIZE:]:
+                queue.put_nowait(event)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+change_feed = TenderChangeFeed()
+
+async def watch_tender_changes():
+    """Feed change_feed from a Mongo change stream when the deployment has one.
+
+    Delete events only carry the ObjectId, so pre-images are enabled to
+    recover the tender id. Standalone servers (and MongoDB < 6.0) fail here
+    and the write handlers keep publishing their own changes.
+    """
+    try:
+        await db.command({"collMod": "tenders", "changeStreamPreAndPostImages": {"enabled": True}})
+        async with db.tenders.watch(
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+        ) as stream:
+            change_feed.from_change_stream = True
+            logger.info("Publishing tender changes from the Mongo change stream")
+            async for change in stream:
+                operation = change["operationType"]
+                if operation in ("insert", "update", "replace") and change.get("fullDocument"):
+                    tender = change["fullDocument"]
+                    change_feed.publish("insert" if operation == "insert" else "update",
+                                        tender["id"], tender_payload(tender))
+                elif operation == "delete" and change.get("fullDocumentBeforeChange"):
+                    change_feed.publish("delete", change["fullDocumentBeforeChange"]["id"])
+    except PyMongoError as exc:
+        logger.info("Change streams unavailable, publishing local writes only: %s", exc)
+    finally:
+        change_feed.from_change_stream = False
+
+async def watch_version_counter():
+    """Follow the counter document. With a shared version, tell this worker's
+    subscribers to refetch when another worker has written (unless the change
+    stream delivers those writes); without one, pick up dimension rebuilds
+    made by other processes."""
+    counter = await db.counters.find_one({"_id": SHARED_VERSION_ID}) or {}
+    seen = (counter.get("epoch"), counter.get("value"))
+    while True:
+        await asyncio.sleep(SHARED_VERSION_POLL_SECONDS)
+        if not tender_version.shared:
+            counter = await db.counters.find_one({"_id": SHARED_VERSION_ID}) or {}
+            if (counter.get("epoch"), counter.get("value")) != seen:
+                seen = (counter.get("epoch"), counter.get("value"))
+                tender_version.bump()
+            continue
+        await tender_version.refresh()
+        epoch, value = tender_version.epoch, tender_version.value
+        own = sum(1 for produced in tender_version.own if (seen[1] or 0) < produced <= value)
+        foreign = epoch != seen[0] or value - (seen[1] or 0) > own
+        tender_version.own = {produced for produced in tender_version.own if produced > value}
+        seen = (epoch, value)
+        if foreign and not change_feed.from_change_stream and change_feed.has_subscribers:
+            change_feed.publish("resync", None)
+
+# Dimensions: tender count and total deal value per distinct customer, sales
+# rep, status, priority and start month, kept in the tender_dimensions
+# collection by applying the before/after images of every write as $inc
+# deltas. They feed the filter lists and the analytics rollups. Each worker
+# caches the (small) collection and reloads it when the tender collection
+# version moves.
+DIMENSIONS = ("customer", "assigned_sales_rep", "status", "priority", "month")
+# Dimensions that are not a plain tender field, as a $group key
+# Legacy ISO-string dates not yet rewritten by migrate_dates.py are converted
+# rather than failing the whole $group; anything unparseable has no month
+DIMENSION_EXPRESSIONS = {"month": {"$dateToString": {
+    "format": "%Y-%m",
+    "date": {"$convert": {"input": "$start_date", "to": "date", "onError": None}},
+}}}
+
+def dimension_value(tender: dict, dimension: str):
+    if dimension == "month":
+        try:
+            start_date = decode_date(tender.get("start_date"))
+        except ValueError:
+            # No month, like onError in the $group expression
+            start_date = None
+        return start_date.strftime("%Y-%m") if start_date else None
+    return tender.get(dimension)
+
+def dimension_key(value) -> str:
+    """Case-insensitive key that autocomplete prefix-matches on."""
+    return str(value).casefold()
+
+def dimension_deltas(changes: List[tuple]) -> Dict[tuple, List[float]]:
+    deltas = {}
+    for before, after in changes:
+        for sign, tender in ((-1, before), (1, after)):
+            if not tender:
+                continue
+            for dimension in DIMENSIONS:
+                delta = deltas.setdefault((dimension, dimension_value(tender, dimension)), [0, 0.0])
+                delta[0] += sign
+                delta[1] += sign * tender.get("deal_value", 0)
+    return {key: delta for key, delta in deltas.items() if delta != [0, 0.0]}
+
+async def record_tender_changes(changes: List[tuple]):
+    """Apply the (before, after) document images of tender writes to the
+    dimensions and the status history."""
+    if not changes:
+        return
+    await record_status_history(changes)
+    await apply_dimension_deltas(dimension_deltas(changes))
+    # Last, so other workers reload the dimensions only once they are updated
+    await tender_version.advance()
+
+async def apply_dimension_deltas(deltas: Dict[tuple, List[float]]):
+    if not deltas:
+        return
+    await db.tender_dimensions.bulk_write([
+        UpdateOne(
+            {"dimension": dimension, "value": value},
+            {
+                "$inc": {"count": count, "deal_value": deal_value},
+                "$setOnInsert": {"key": dimension_key(value)},
+            },
+            upsert=True,
+        )
+        for (dimension, value), (count, deal_value) in deltas.items()
+    ], ordered=False)
+    # Reference counting: values no tender uses any more disappear
+    if any(count < 0 for count, _ in deltas.values()):
+        await db.tender_dimensions.delete_many({"count": {"$lte": 0}})
+
+# Status history: every status a tender enters is appended to
+# tender_status_history with the time it spent in the previous one, so stage
+# analytics are single indexed $group pipelines over the transitions instead
+# of a replay of every tender's timeline. Nothing is ever updated or removed,
+# not even when the tender is deleted.
+STATUS_VALUES = [status.value for status in TenderStatus]
+OUTCOME_STATUSES = [TenderStatus.WON.value, TenderStatus.LOST.value]
+
+async def record_status_history(changes: List[tuple]):
+    moved = [
+        (before, after) for before, after in changes
+        if after and (before is None or before.get("status") != after.get("status"))
+    ]
+    if not moved:
+        return
+    # A tender entered its current status with its latest transition
+    entered = {}
+    moved_ids = [before["id"] for before, _ in moved if before]
+    if moved_ids:
+        pipeline = [
+            {"$match": {"tender_id": {"$in": moved_ids}}},
+            {"$group": {"_id": "$tender_id", "at": {"$max": "$at"}}},
+        ]
+        async for group in db.tender_status_history.aggregate(pipeline):
+            entered[group["_id"]] = group["at"]
+    transitions = []
+    for before, after in moved:
+        at = after.get("updated_at") if before else after.get("created_at")
+        transition = {
+            "tender_id": after["id"],
+            "from_status": None,
+            "to_status": after.get("status"),
+            "at": at,
+            "entered_at": None,
+            "duration": None,
+            "customer": after.get("customer"),
+            "assigned_sales_rep": after.get("assigned_sales_rep"),
+            "deal_value": after.get("deal_value"),
+        }
+        if before:
+            # Tenders older than the history count from their creation
+            entered_at = entered.get(after["id"]) or before.get("created_at")
+            transition["from_status"] = before.get("status")
+            transition["entered_at"] = entered_at
+            if entered_at and at:
+                transition["duration"] = (at - entered_at).total_seconds()
+        entered[after["id"]] = at
+        transitions.append(transition)
+    await db.tender_status_history.insert_many(transitions, ordered=False)
+
+async def rebuild_dimensions():
+    """Recompute every dimension from the tenders; idempotent and safe to repeat."""
+    seen = set()
+    upserts = []
+    for dimension in DIMENSIONS:
+        group_key = DIMENSION_EXPRESSIONS.get(dimension, f"${dimension}")
+        pipeline = [{"$group": {
+            "_id": group_key, "count": {"$sum": 1}, "deal_value": {"$sum": "$deal_value"},
+        }}]
+        async for group in db.tenders.aggregate(pipeline):
+            upserts.append(UpdateOne(
+                {"dimension": dimension, "value": group["_id"]},
+                {"$set": {
+                    "count": group["count"],
+                    "deal_value": group["deal_value"],
+                    "key": dimension_key(group["_id"]),
+                }},
+                upsert=True,
+            ))
+            seen.add((dimension, group["_id"]))
+    if upserts:
+        await db.tender_dimensions.bulk_write(upserts, ordered=False)
+    stale = [
+        entry["_id"] async for entry in db.tender_dimensions.find({}, {"dimension": 1, "value": 1})
+        if (entry["dimension"], entry["value"]) not in seen
+    ]
+    if stale:
+        await db.tender_dimensions.delete_many({"_id": {"$in": stale}})
+    # Persisted, so workers learn of a rebuild run by another process too
+    await tender_version.advance(persist=True)
+
+class DimensionCache:
+    def __init__(self):
+        self.version = None
+        self.values = {}
+
+    async def get(self, dimension: str) -> List[dict]:
+        if self.version != tender_version.etag:
+            version = tender_version.etag
+            values = {name: [] for name in DIMENSIONS}
+            entries = db.tender_dimensions.find({}, {"_id": 0})
+            entries = entries.sort([("dimension", 1), ("value", 1)])
+            async for entry in entries:
+                values.setdefault(entry["dimension"], []).append({
+                    "value": entry["value"],
+                    "count": entry["count"],
+                    "deal_value": entry["deal_value"],
+                })
+            self.values, self.version = values, version
+        return self.values.get(dimension, [])
+
+dimension_cache = DimensionCache()
+
+def format_sse(event: dict) -> str:
+    data = encode_json({"id": event["id"], "tender": event["tender"]}).decode()
+    return f"id: {change_feed.origin}-{event['seq']}\nevent: {event['op']}\ndata: {data}\n\n"
+
+async def stream_tender_events(request: Request, queue: asyncio.Queue):
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        change_feed.unsubscribe(queue)
+
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "Sales Dashboard API"}
 
+READY_TIMEOUT = 2
+
+@api_router.get("/ready")
+async def get_ready():
+    """Readiness probe: 503 until warm-up is done, while shutting down, or
+    while the database does not answer."""
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Not ready")
+    started = perf_counter()
+    try:
+        await asyncio.wait_for(db.command({"ping": 1}), READY_TIMEOUT)
+    except (PyMongoError, asyncio.TimeoutError) as exc:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {exc!r}")
+    readiness = {
+        "status": "ready",
+        "storage": STORAGE_BACKEND,
+        "ping_ms": round((perf_counter() - started) * 1000, 2),
+    }
+    if STORAGE_BACKEND == 'mongo':
+        readiness["pool"] = {
+            "open": mongo_pool.open,
+            "checked_out": mongo_pool.checked_out,
+            "checkout_failures": mongo_pool.checkout_failures,
+            "min_size": MONGO_MIN_POOL_SIZE,
+            "max_size": MONGO_MAX_POOL_SIZE,
+        }
+    return readiness
+
 @api_router.post("/tenders", response_model=Tender)
 async def create_tender(tender_data: TenderCreate):
-    tender_dict = tender_data.dict()
-    tender_dict['start_date'] = tender_dict['start_date'].isoformat()
-    tender_dict['expiry_date'] = tender_dict['expiry_date'].isoformat()
-    tender_dict['due_date'] = tender_dict['due_date'].isoformat()
-    
-    tender_obj = Tender(**tender_dict)
-    tender_dict = tender_obj.dict()
-    tender_dict['start_date'] = tender_dict['start_date'].isoformat()
-    tender_dict['expiry_date'] = tender_dict['expiry_date'].isoformat()
-    tender_dict['due_date'] = tender_dict['due_date'].isoformat()
-    
-    await db.tenders.insert_one(tender_dict)
+    tender_obj = Tender(**tender_data.model_dump())
+    document = dates_to_bson(tender_obj.dict())
+    await db.tenders.insert_one(dict(document))
+    await record_tender_changes([(None, document)])
+    change_feed.publish_local("insert", tender_obj.id, tender_obj.model_dump())
     return tender_obj
 
 @api_router.get("/tenders", response_model=List[Tender])
 async def get_tenders(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     priority: Optional[str] = None,
-    customer: Optional[str] = None
+    customer: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    envelope: bool = False
 ):
+    etag = await tender_version.current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    field_set = parse_fields(fields)
+    query = filter_query(status, priority, customer)
+    if cursor:
+        query.update(decode_cursor(cursor))
+    
+    # Streaming clients get every matching row unless they ask for a limit
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_tenders_ndjson(query, limit, field_set),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=cache_headers(etag),
+        )
+    
+    # Without limit or cursor the whole list is returned, as it always was,
+    # streamed so that it is never held in memory at once
+    if not (limit or cursor or envelope):
+        return StreamingResponse(
+            stream_tenders_json(query, field_set),
+            media_type="application/json",
+            headers=cache_headers(etag),
+        )
+    
+    limit = limit or DEFAULT_PAGE_SIZE
+    projection = tender_projection(field_set) if field_set else None
+    # Fetch one extra row to know whether another page follows
+    with server_timing("db"):
+        page = db.tenders.find(query, projection).sort(TENDER_SORT).limit(limit + 1)
+        tenders = await page.to_list(limit + 1)
+    headers = cache_headers(etag)
+    next_cursor = None
+    if len(tenders) > limit:
+        tenders = tenders[:limit]
+        next_cursor = headers["X-Next-Cursor"] = encode_cursor(tenders[-1])
+    
+    with server_timing("decode"):
+        payloads = [tender_payload(tender, field_set) for tender in tenders]
+    if envelope:
+        return json_response({"tenders": payloads, "next_cursor": next_cursor}, headers)
+    if field_set or FAST_JSON:
+        # Partial rows bypass response_model=List[Tender], which needs every field
+        return json_response(payloads, headers)
+    
+    response.headers.update(headers)
+    return payloads
+
+MAX_EXPIRING_WITHIN = 366 * 24 * 3600
+
+def filter_query(status: Optional[str], priority: Optional[str], customer: Optional[str]) -> dict:
     query = {}
     if status:
         query["status"] = status
@@ -116,79 +1566,585 @@ async def get_tenders(
         query["priority"] = priority
     if customer:
         query["customer"] = customer
+    return query
+
+@api_router.get("/tenders/next-due", response_model=Optional[Tender])
+async def get_next_due_tender(
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    customer: Optional[str] = None,
+    after: Optional[datetime] = None,
+    fields: Optional[str] = None
+):
+    """The tender with the closest due_date after `after` (default: now, UTC)."""
+    field_set = parse_fields(fields)
+    query = filter_query(status, priority, customer)
+    query["due_date"] = {"$gt": after or datetime.utcnow()}
+    projection = tender_projection(field_set) if field_set else None
+    with server_timing("db"):
+        tender = await db.tenders.find_one(query, projection, sort=[("due_date", 1)])
+    with server_timing("decode"):
+        payload = tender_payload(tender, field_set) if tender else None
+    if field_set or FAST_JSON:
+        return json_response(payload)
+    return payload
+
+@api_router.get("/tenders/expiring", response_model=List[Tender])
+async def get_expiring_tenders(
+    within: int = Query(24 * 3600, ge=1, le=MAX_EXPIRING_WITHIN, description="Window in seconds"),
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    customer: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[datetime] = None,
+    fields: Optional[str] = None
+):
+    """Tenders due in the `within` seconds following `after`, soonest first."""
+    field_set = parse_fields(fields)
+    now = after or datetime.utcnow()
+    query = filter_query(status, priority, customer)
+    query["due_date"] = {"$gt": now, "$lte": now + timedelta(seconds=within)}
+    projection = tender_projection(field_set) if field_set else None
+    with server_timing("db"):
+        cursor = db.tenders.find(query, projection).sort("due_date", 1).limit(limit)
+        tenders = await cursor.to_list(limit)
+    with server_timing("decode"):
+        payloads = [tender_payload(tender, field_set) for tender in tenders]
+    if field_set or FAST_JSON:
+        return json_response(payloads)
+    return payloads
+
+MAX_TIMELINE_SIZE = 5000
+
+@api_router.get("/tenders/timeline", response_model=TenderTimeline)
+async def get_tender_timeline(
+    start: date,
+    end: date,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    customer: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_TIMELINE_SIZE),
+    fields: Optional[str] = None
+):
+    """Tenders whose [start_date, expiry_date] overlaps [start, end].
+
+    The overall first start and last expiry come back with every window so
+    the chart can size its axis without downloading the full history.
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    field_set = parse_fields(fields)
+    query = filter_query(status, priority, customer)
+    query["start_date"] = {"$lte": datetime.combine(end, time.min)}
+    query["expiry_date"] = {"$gte": datetime.combine(start, time.min)}
+    projection = tender_projection(field_set) if field_set else None
     
-    tenders = await db.tenders.find(query).to_list(1000)
-    
-    for tender in tenders:
-        if isinstance(tender.get('start_date'), str):
-            tender['start_date'] = datetime.fromisoformat(tender['start_date']).date()
-        if isinstance(tender.get('expiry_date'), str):
-            tender['expiry_date'] = datetime.fromisoformat(tender['expiry_date']).date()
-        if isinstance(tender.get('due_date'), str):
-            tender['due_date'] = datetime.fromisoformat(tender['due_date'])
+    cursor = db.tenders.find(query, projection).sort("start_date", 1).limit(limit + 1)
+    with server_timing("db"):
+        tenders, first, last = await asyncio.gather(
+            cursor.to_list(limit + 1),
+            db.tenders.find_one({"start_date": {"$type": "date"}}, {"start_date": 1},
+                                sort=[("start_date", 1)]),
+            db.tenders.find_one({"expiry_date": {"$type": "date"}}, {"expiry_date": 1},
+                                sort=[("expiry_date", -1)]),
+        )
+    timeline = {
+        "min_date": first["start_date"].date() if first else None,
+        "max_date": last["expiry_date"].date() if last else None,
+        "truncated": len(tenders) > limit,
+    }
+    tenders = tenders[:limit]
     
-    return [Tender(**tender) for tender in tenders]
+    with server_timing("decode"):
+        timeline["tenders"] = [tender_payload(tender, field_set) for tender in tenders]
+    if field_set or FAST_JSON:
+        return json_response(timeline)
+    return timeline
+
+@api_router.get("/tenders/search", response_model=List[Tender])
+async def search_tenders(
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    customer: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """Tenders whose tender_name, customer or item contain any word of `q`,
+    most relevant first."""
+    field_set = parse_fields(fields)
+    query = filter_query(status, priority, customer)
+    query["$text"] = {"$search": q}
+    projection = tender_projection(field_set) if field_set else {"_id": 0}
+    projection["score"] = {"$meta": "textScore"}
+    with server_timing("db"):
+        ranked = db.tenders.find(query, projection).sort([("score", {"$meta": "textScore"})])
+        tenders = await ranked.limit(limit).to_list(limit)
+    with server_timing("decode"):
+        payloads = [tender_payload(tender, field_set) for tender in tenders]
+    if field_set or FAST_JSON:
+        return json_response(payloads)
+    return payloads
+
+@api_router.get("/tenders/export")
+async def export_tenders(
+    file_format: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    customer: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Every tender matching the list filters as a CSV or XLSX download."""
+    field_set = parse_fields(fields)
+    columns = [name for name in Tender.model_fields if field_set is None or name in field_set]
+    query = filter_query(status, priority, customer)
+    filename = f"tenders-{datetime.utcnow():%Y%m%d-%H%M%S}.{file_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if file_format == "csv":
+        return StreamingResponse(stream_tenders_csv(query, field_set, columns),
+                                 media_type=EXPORT_MEDIA_TYPES["csv"], headers=headers)
+    if xlsxwriter is None:
+        raise HTTPException(status_code=501, detail="XLSX export needs the XlsxWriter package")
+    path = await write_tenders_xlsx(query, field_set, columns)
+    return FileResponse(path, media_type=EXPORT_MEDIA_TYPES["xlsx"], headers=headers,
+                        background=BackgroundTask(os.unlink, path))
+
+@api_router.get("/tenders/stream")
+async def stream_tender_changes(request: Request, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events for tender inserts, updates and deletes.
+
+    Reconnecting clients send Last-Event-ID and get the events they missed,
+    or a single resync event when those are no longer buffered.
+    """
+    queue = change_feed.subscribe(change_feed.last_sequence(last_event_id))
+    return StreamingResponse(
+        stream_tender_events(request, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @api_router.get("/tenders/{tender_id}", response_model=Tender)
-async def get_tender(tender_id: str):
-    tender = await db.tenders.find_one({"id": tender_id})
+async def get_tender(request: Request, response: Response, tender_id: str,
+                     fields: Optional[str] = None):
+    field_set = parse_fields(fields)
+    # The version is read even when not requested: it is the tender's ETag,
+    # the one If-Match on PUT and PATCH expects
+    projection = tender_projection(field_set | {"version"}) if field_set else None
+    with server_timing("db"):
+        tender = await db.tenders.find_one({"id": tender_id}, projection)
     if not tender:
         raise HTTPException(status_code=404, detail="Tender not found")
     
-    if isinstance(tender.get('start_date'), str):
-        tender['start_date'] = datetime.fromisoformat(tender['start_date']).date()
-    if isinstance(tender.get('expiry_date'), str):
-        tender['expiry_date'] = datetime.fromisoformat(tender['expiry_date']).date()
-    if isinstance(tender.get('due_date'), str):
-        tender['due_date'] = datetime.fromisoformat(tender['due_date'])
+    etag = version_etag(decode_version(tender.get("version")))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    return Tender(**tender)
+    with server_timing("decode"):
+        payload = tender_payload(tender, field_set)
+    if field_set or FAST_JSON:
+        return json_response(payload, cache_headers(etag))
+    
+    response.headers.update(cache_headers(etag))
+    return payload
 
 @api_router.put("/tenders/{tender_id}", response_model=Tender)
-async def update_tender(tender_id: str, tender_update: TenderUpdate):
-    update_data = {k: v for k, v in tender_update.dict().items() if v is not None}
+async def update_tender(
+    tender_id: str,
+    tender_update: TenderUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    updated_tender = await apply_tender_update(tender_id, update_to_document(tender_update),
+                                               parse_if_match(if_match))
+    response.headers["ETag"] = version_etag(updated_tender["version"])
+    return updated_tender
+
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+MERGE_PATCH_ATTEMPTS = 3
+
+@api_router.patch("/tenders/{tender_id}", response_model=Tender)
+async def patch_tender(
+    tender_id: str,
+    response: Response,
+    patch: Dict[str, Any] = Body(..., media_type=MERGE_PATCH_MEDIA_TYPE),
+    if_match: Optional[str] = Header(None)
+):
+    """JSON merge patch (RFC 7396); only fields that differ from the stored
+    tender are written, and a patch that changes nothing writes nothing."""
+    removed = sorted(name for name, value in patch.items()
+                     if value is None and name in TenderUpdate.model_fields)
+    if removed:
+        raise HTTPException(status_code=422,
+                            detail=f"Required fields cannot be removed: {', '.join(removed)}")
+    try:
+        fields = update_to_document(TenderUpdate(**patch))
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=validation_message(exc))
+    del fields["updated_at"]
+    expected = parse_if_match(if_match)
     
-    if 'start_date' in update_data:
-        update_data['start_date'] = update_data['start_date'].isoformat()
-    if 'expiry_date' in update_data:
-        update_data['expiry_date'] = update_data['expiry_date'].isoformat()
-    if 'due_date' in update_data:
-        update_data['due_date'] = update_data['due_date'].isoformat()
+    # Read, diff, then write only if the version read is still current
+    for _ in range(MERGE_PATCH_ATTEMPTS):
+        current = await db.tenders.find_one({"id": tender_id})
+        if current is None:
+            raise HTTPException(status_code=404, detail="Tender not found")
+        version = decode_version(current.get("version"))
+        if expected is not None and expected != version:
+            raise version_conflict(version)
+        changed = {name: value for name, value in fields.items() if current.get(name) != value}
+        if not changed:
+            patched = tender_payload(current)
+            break
+        changed["updated_at"] = datetime.utcnow()
+        try:
+            patched = await apply_tender_update(tender_id, changed, version)
+            break
+        except HTTPException as exc:
+            # Without If-Match a concurrent write just means diffing again
+            if exc.status_code != 409 or expected is not None:
+                raise
+    else:
+        raise HTTPException(status_code=409,
+                            detail="Tender is being modified concurrently, try again")
+    response.headers["ETag"] = version_etag(patched["version"])
+    return patched
+
+@api_router.delete("/tenders/{tender_id}")
+async def delete_tender(tender_id: str):
+    before = await db.tenders.find_one_and_delete({"id": tender_id})
+    if before is None:
+        raise HTTPException(status_code=404, detail="Tender not found")
+    await record_tender_changes([(before, None)])
+    change_feed.publish_local("delete", tender_id)
+    return {"message": "Tender deleted successfully"}
+
+MAX_BULK_ITEMS = 10000
+BULK_APPLIED = {"created": "insert", "updated": "update", "deleted": "delete"}
+
+def publish_bulk_changes(applied: List[tuple]):
+    if change_feed.from_change_stream:
+        tender_version.bump()
+        return
+    for result, before, after in applied:
+        payload = tender_payload(after) if after else None
+        change_feed.publish(BULK_APPLIED[result.status], result.id, payload)
+
+@api_router.post("/tenders/bulk", response_model=TenderBulkResult)
+async def bulk_tenders(bulk: TenderBulkRequest):
+    """Apply many creates, partial updates and deletes in one unordered bulk_write."""
+    if len(bulk.create) + len(bulk.update) + len(bulk.delete) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ITEMS} items per request")
     
-    update_data['updated_at'] = datetime.utcnow()
+    results = []
+    operations = []
+    # operations[i] was produced by results[pending[i]] and turns the document
+    # images[i][0] into images[i][1]
+    pending = []
+    images = []
     
-    result = await db.tenders.update_one({"id": tender_id}, {"$set": update_data})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Tender not found")
+    def queue(result: TenderBulkItemResult, operation,
+              before: Optional[dict], after: Optional[dict]):
+        pending.append(len(results))
+        results.append(result)
+        operations.append(operation)
+        images.append((before, after))
+    
+    def reject(op: str, index: int, tender_id: Optional[str], status: str, error):
+        if isinstance(error, ValidationError):
+            error = validation_message(error)
+        results.append(TenderBulkItemResult(op=op, index=index, id=tender_id, status=status,
+                                            error=error))
+    
+    for index, item in enumerate(bulk.create):
+        try:
+            tender_obj = Tender(**TenderCreate(**item).model_dump())
+        except ValidationError as exc:
+            reject("create", index, None, "invalid", exc)
+            continue
+        document = dates_to_bson(tender_obj.dict())
+        queue(TenderBulkItemResult(op="create", index=index, id=tender_obj.id, status="created"),
+              InsertOne(dict(document)), None, document)
     
-    updated_tender = await db.tenders.find_one({"id": tender_id})
+    # One lookup fetches the current image of every update and delete target
+    target_ids = [item.get("id") for item in bulk.update] + bulk.delete
+    current = {}
+    if target_ids:
+        async for tender in db.tenders.find({"id": {"$in": target_ids}}):
+            current[tender["id"]] = tender
     
-    if isinstance(updated_tender.get('start_date'), str):
-        updated_tender['start_date'] = datetime.fromisoformat(updated_tender['start_date']).date()
-    if isinstance(updated_tender.get('expiry_date'), str):
-        updated_tender['expiry_date'] = datetime.fromisoformat(updated_tender['expiry_date']).date()
-    if isinstance(updated_tender.get('due_date'), str):
-        updated_tender['due_date'] = datetime.fromisoformat(updated_tender['due_date'])
+    for index, item in enumerate(bulk.update):
+        try:
+            tender_update = TenderBulkUpdate(**item)
+        except ValidationError as exc:
+            reject("update", index, item.get("id"), "invalid", exc)
+            continue
+        before = current.get(tender_update.id)
+        if before is None:
+            reject("update", index, tender_update.id, "not_found", "Tender not found")
+            continue
+        update_data = update_to_document(tender_update)
+        current[tender_update.id] = after = {
+            **before, **update_data, "version": decode_version(before.get("version")) + 1,
+        }
+        update = {"$set": update_data, "$inc": {"version": 1}}
+        queue(TenderBulkItemResult(op="update", index=index, id=tender_update.id, status="updated"),
+              UpdateOne({"id": tender_update.id}, update), before, after)
     
-    return Tender(**updated_tender)
+    for index, tender_id in enumerate(bulk.delete):
+        before = current.pop(tender_id, None)
+        if before is None:
+            reject("delete", index, tender_id, "not_found", "Tender not found")
+            continue
+        queue(TenderBulkItemResult(op="delete", index=index, id=tender_id, status="deleted"),
+              DeleteOne({"id": tender_id}), before, None)
+    
+    if operations:
+        try:
+            await db.tenders.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                result = results[pending[error["index"]]]
+                result.status = "error"
+                result.error = error.get("errmsg")
+    
+    applied = [
+        (results[result_index], before, after)
+        for result_index, (before, after) in zip(pending, images)
+        if results[result_index].status in BULK_APPLIED
+    ]
+    await record_tender_changes([(before, after) for _, before, after in applied])
+    publish_bulk_changes(applied)
+    
+    summary = TenderBulkResult(results=results)
+    for result in results:
+        if result.status in BULK_APPLIED:
+            setattr(summary, result.status, getattr(summary, result.status) + 1)
+        else:
+            summary.failed += 1
+    return summary
 
-@api_router.delete("/tenders/{tender_id}")
-async def delete_tender(tender_id: str):
-    result = await db.tenders.delete_one({"id": tender_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Tender not found")
-    return {"message": "Tender deleted successfully"}
+@api_router.post("/tenders/import", response_model=TenderImportJob, status_code=202)
+async def import_tenders(request: Request,
+                         file_format: str = Query("csv", alias="format", pattern="^(csv|xlsx)$")):
+    """Queue a CSV or XLSX sheet, sent as the request body, for a chunked import."""
+    if file_format == "xlsx" and openpyxl is None:
+        raise HTTPException(status_code=501, detail="XLSX import needs the openpyxl package")
+    path = await spool_upload(request, f".{file_format}")
+    job = TenderImportJob(format=file_format)
+    try:
+        await db.import_jobs.insert_one(job.model_dump())
+    except BaseException:
+        os.unlink(path)
+        raise
+    task = asyncio.create_task(run_import(job.id, path, file_format))
+    import_tasks.add(task)
+    task.add_done_callback(import_tasks.discard)
+    return job
+
+@api_router.get("/tenders/import/{job_id}", response_model=TenderImportJob)
+async def get_import_job(job_id: str):
+    job = await db.import_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
 
 # Get unique filter values
 @api_router.get("/tenders/filters/customers")
-async def get_customers():
-    customers = await db.tenders.distinct("customer")
-    return {"customers": customers}
+async def get_customers(request: Request, response: Response):
+    etag = await tender_version.current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    customers = await dimension_cache.get("customer")
+    response.headers.update(cache_headers(etag))
+    return {"customers": [entry["value"] for entry in customers], "details": customers}
 
 @api_router.get("/tenders/filters/sales-reps")
-async def get_sales_reps():
-    sales_reps = await db.tenders.distinct("assigned_sales_rep")
-    return {"sales_reps": sales_reps}
+async def get_sales_reps(request: Request, response: Response):
+    etag = await tender_version.current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    sales_reps = await dimension_cache.get("assigned_sales_rep")
+    response.headers.update(cache_headers(etag))
+    return {"sales_reps": [entry["value"] for entry in sales_reps], "details": sales_reps}
+
+@api_router.get("/analytics/summary")
+async def get_analytics_summary(request: Request, response: Response):
+    """Tender count and deal value in total and per status, customer, priority,
+    sales rep and start month, read from the maintained dimensions."""
+    etag = await tender_version.current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    rollups = {dimension: await dimension_cache.get(dimension) for dimension in DIMENSIONS}
+    response.headers.update(cache_headers(etag))
+    return {
+        "total": {
+            "count": sum(entry["count"] for entry in rollups["status"]),
+            "deal_value": sum(entry["deal_value"] for entry in rollups["status"]),
+        },
+        **rollups,
+    }
+
+def history_window(start: Optional[date], end: Optional[date]) -> dict:
+    """Filter on the transition time; both bounds are inclusive days."""
+    window = {}
+    if start:
+        window["$gte"] = datetime.combine(start, time.min)
+    if end:
+        window["$lt"] = datetime.combine(end + timedelta(days=1), time.min)
+    return {"at": window} if window else {}
+
+@api_router.get("/analytics/stage-durations")
+async def get_stage_durations(start: Optional[date] = None, end: Optional[date] = None):
+    """How long tenders stayed in each status before moving on, in seconds."""
+    pipeline = [
+        {"$match": {"from_status": {"$in": STATUS_VALUES}, **history_window(start, end)}},
+        {"$group": {
+            "_id": "$from_status",
+            "transitions": {"$sum": 1},
+            "avg_seconds": {"$avg": "$duration"},
+            "min_seconds": {"$min": "$duration"},
+            "max_seconds": {"$max": "$duration"},
+        }},
+    ]
+    groups = {group.pop("_id"): group
+              async for group in db.tender_status_history.aggregate(pipeline)}
+    return {"stages": [{"status": status, **groups[status]}
+                       for status in STATUS_VALUES if status in groups]}
+
+@api_router.get("/analytics/conversions")
+async def get_stage_conversions(start: Optional[date] = None, end: Optional[date] = None):
+    """Where tenders went when they left each status, as counts and shares."""
+    pipeline = [
+        {"$match": {"from_status": {"$in": STATUS_VALUES}, **history_window(start, end)}},
+        {"$group": {
+            "_id": {"from_status": "$from_status", "to_status": "$to_status"},
+            "count": {"$sum": 1},
+        }},
+    ]
+    conversions = [{**group["_id"], "count": group["count"]}
+                   async for group in db.tender_status_history.aggregate(pipeline)]
+    exits = {}
+    for conversion in conversions:
+        status = conversion["from_status"]
+        exits[status] = exits.get(status, 0) + conversion["count"]
+    for conversion in conversions:
+        conversion["rate"] = conversion["count"] / exits[conversion["from_status"]]
+    conversions.sort(key=lambda c: (STATUS_VALUES.index(c["from_status"]), -c["count"]))
+    return {"conversions": conversions}
+
+@api_router.get("/analytics/win-rates")
+async def get_win_rates(
+    by: str = Query("assigned_sales_rep", pattern="^(assigned_sales_rep|customer)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    """Won and lost outcomes per sales rep or customer, with the win rate."""
+    pipeline = [
+        {"$match": {"to_status": {"$in": OUTCOME_STATUSES}, **history_window(start, end)}},
+        {"$group": {
+            "_id": {"value": f"${by}", "outcome": "$to_status"},
+            "count": {"$sum": 1},
+            "deal_value": {"$sum": "$deal_value"},
+        }},
+    ]
+    rates = {}
+    async for group in db.tender_status_history.aggregate(pipeline):
+        entry = rates.setdefault(group["_id"]["value"], {
+            "value": group["_id"]["value"], "won": 0, "lost": 0,
+            "won_deal_value": 0.0, "lost_deal_value": 0.0,
+        })
+        outcome = "won" if group["_id"]["outcome"] == TenderStatus.WON.value else "lost"
+        entry[outcome] += group["count"]
+        entry[f"{outcome}_deal_value"] += group["deal_value"]
+    for entry in rates.values():
+        entry["win_rate"] = entry["won"] / (entry["won"] + entry["lost"])
+    return {"by": by, "win_rates": sorted(rates.values(), key=lambda entry: str(entry["value"]))}
+
+AUTOCOMPLETE_DIMENSIONS = {"customers": "customer", "sales-reps": "assigned_sales_rep"}
+MAX_SUGGESTIONS = 100
+
+@api_router.get("/tenders/filters/{dimension}/autocomplete")
+async def autocomplete_dimension(
+    dimension: str,
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)
+):
+    """Customers or sales reps starting with `prefix` (case-insensitive), in
+    alphabetical order, read as one range of the dimension_key index."""
+    if dimension not in AUTOCOMPLETE_DIMENSIONS:
+        raise HTTPException(status_code=404, detail="Unknown filter")
+    key = dimension_key(prefix)
+    entries = await db.tender_dimensions.find(
+        {
+            "dimension": AUTOCOMPLETE_DIMENSIONS[dimension],
+            "key": {"$gte": key, "$lt": key + "\U0010ffff"},
+        },
+        {"_id": 0, "value": 1, "count": 1, "deal_value": 1},
+    ).sort([("dimension", 1), ("key", 1)]).limit(limit).to_list(limit)
+    return {"suggestions": [entry["value"] for entry in entries], "details": entries}
+
+# Admin
+@api_router.get("/admin/indexes/advice", dependencies=[Depends(require_admin)])
+async def get_index_advice():
+    """Explain each route query and report the ones that scan the collection."""
+    existing = {}
+    missing = []
+    for collection, indexes in COLLECTION_INDEXES.items():
+        existing[collection] = sorted(await db[collection].index_information())
+        missing.extend(f"{collection}.{index.document['name']}" for index in indexes
+                       if index.document["name"] not in existing[collection])
+    
+    queries = []
+    for route, command in route_query_explains().items():
+        explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        queries.append({
+            "route": route,
+            "stages": stages,
+            "collection_scan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+        })
+    
+    return {
+        "indexes": existing,
+        "missing_indexes": missing,
+        "collection_scans": [q["route"] for q in queries if q["collection_scan"]],
+        "queries": queries,
+    }
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def get_profiles():
+    """The most recent request profiles, newest first, without their stacks."""
+    return [
+        {key: value for key, value in profile.items() if key != "folded"}
+        for profile in reversed(recent_profiles)
+    ]
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Folded stacks of one profile, ready for flamegraph.pl or speedscope."""
+    for profile in recent_profiles:
+        if profile["id"] == profile_id:
+            return Response(content=profile["folded"], media_type="text/plain")
+    raise HTTPException(status_code=404, detail="Profile not found")
+
+@api_router.post("/admin/dimensions/rebuild", dependencies=[Depends(require_admin)])
+async def post_rebuild_dimensions():
+    """Recompute the filter dimensions and analytics rollups from the tenders."""
+    await rebuild_dimensions()
+    return {"message": "Dimensions rebuilt"}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -199,7 +2155,10 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Disposition"],
 )
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -208,6 +2167,86 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def seed_dimensions():
+    # First start on an existing database, or dimensions written before the
+    # autocomplete key or a dimension existed: build them once. Every tender
+    # has a value in every dimension, so a dimension without entries is new.
+    if not await db.tenders.find_one():
+        return
+    outdated = await db.tender_dimensions.find_one({"key": {"$exists": False}})
+    present = await db.tender_dimensions.distinct("dimension")
+    if outdated or not set(DIMENSIONS).issubset(present):
+        logger.info("Building tender dimensions from existing tenders")
+        await rebuild_dimensions()
+
+# Requests sent through the whole app (middleware, routing, validation and
+# serialisation included) before a worker reports ready
+WARMUP_PATHS = [
+    path.strip() for path in os.environ.get(
+        'WARMUP_PATHS',
+        '/api/tenders?limit=500,/api/tenders/filters/customers,'
+        '/api/tenders/filters/sales-reps,/api/analytics/summary',
+    ).split(',') if path.strip()
+]
+
+async def asgi_request(app, method: str, path: str, query: str = "", body: bytes = b"",
+                       headers: Optional[List[tuple]] = None) -> Tuple[int, dict, bytes]:
+    """Run one request through an ASGI app in-process, without sockets, and
+    return its status, headers and body. Shared by the warm-up and the
+    benchmarks."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": query.encode(), "headers": headers or [],
+        "client": ("in-process", 0), "server": ("in-process", 80),
+    }
+    status = 0
+    response_headers = {}
+    chunks = []
+    request_sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Streaming responses and middleware listen for a disconnect; it
+        # comes once the response is complete
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, response_headers, b"".join(chunks)
+
+async def warm_up(app: Optional[FastAPI] = None):
+    """Open the minimum pool and run the hottest reads once, so the first real
+    requests find connections, server caches and code paths already warm."""
+    started = perf_counter()
+    connections = MONGO_MIN_POOL_SIZE if STORAGE_BACKEND == 'mongo' else 1
+    await asyncio.gather(*(db.command({"ping": 1}) for _ in range(max(connections, 1))))
+    first_page = db.tenders.find({}).sort(TENDER_SORT).limit(DEFAULT_PAGE_SIZE)
+    tenders = await first_page.to_list(DEFAULT_PAGE_SIZE)
+    encode_json([tender_payload(tender) for tender in tenders])
+    for dimension in DIMENSIONS:
+        await dimension_cache.get(dimension)
+    for path in WARMUP_PATHS if app else ():
+        try:
+            path, _, query = path.partition("?")
+            status, _, _ = await asgi_request(app, "GET", path, query)
+        except Exception as exc:
+            status = exc
+        if status != 200:
+            logger.warning("Warm-up request GET %s failed: %s", path, status)
+    logger.info("Warmed up in %.0f ms", (perf_counter() - started) * 1000)
\ No newline at end of file
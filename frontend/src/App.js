@@ -9,10 +9,12 @@ import jsPDF from 'jspdf';
 import html2canvas from 'html2canvas';
 
 // Live Countdown Panel Component
-const LiveCountdownPanel = ({ tenders }) => {
+const LiveCountdownPanel = ({ tenders, filters = {} }) => {
   const [currentTime, setCurrentTime] = useState(new Date());
   const [reminderEnabled, setReminderEnabled] = useState(false);
   const [notifiedTenders, setNotifiedTenders] = useState(new Set());
+  const [nextTender, setNextTender] = useState(null);
+  const fetchingNext = useRef(false);
 
   // Update current time every second
   useEffect(() => {
@@ -23,17 +25,35 @@ const LiveCountdownPanel = ({ tenders }) => {
     return () => clearInterval(timer);
   }, []);
 
-  // Find the next upcoming tender expiration
-  const getNextExpiringTender = () => {
-    const now = currentTime;
-    const futureTenders = tenders
-      .filter(tender => new Date(tender.due_date) > now)
-      .sort((a, b) => new Date(a.due_date) - new Date(b.due_date));
-    
-    return futureTenders.length > 0 ? futureTenders[0] : null;
+  // Ask the backend for the next upcoming tender (one indexed query) instead
+  // of filtering and sorting the whole list every second
+  const fetchNextTender = async () => {
+    if (fetchingNext.current) return;
+    fetchingNext.current = true;
+    try {
+      const params = { after: new Date().toISOString(), fields: 'tender_name,customer,due_date' };
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params[key] = value;
+      });
+      const response = await axios.get(`${API}/tenders/next-due`, { params });
+      setNextTender(response.data);
+    } catch (error) {
+      console.error('Error fetching next due tender:', error);
+    } finally {
+      fetchingNext.current = false;
+    }
   };
 
-  const nextTender = getNextExpiringTender();
+  useEffect(() => {
+    fetchNextTender();
+  }, [tenders, filters]);
+
+  // Move on to the following tender once the current one is due
+  useEffect(() => {
+    if (nextTender && new Date(nextTender.due_date) <= currentTime) {
+      fetchNextTender();
+    }
+  }, [currentTime]);
 
   // Calculate countdown
   const getCountdown = (dueDate) => {
@@ -615,14 +635,23 @@ const GanttChart = ({ tenders, isPrintMode = false }) => {
   );
 };
 
+// Count and deal value per value of a field, from the server rollup when one
+// is given or else from the tenders in view
+const rollupEntry = (rollup, tenders, field, value) => {
+  if (rollup) {
+    const entry = rollup.find(e => e.value === value);
+    return { count: entry ? entry.count : 0, value: entry ? entry.deal_value : 0 };
+  }
+  const matching = tenders.filter(tender => tender[field] === value);
+  return { count: matching.length, value: matching.reduce((sum, tender) => sum + tender.deal_value, 0) };
+};
+
 // Sales Funnel Chart Component
-const SalesFunnelChart = ({ tenders }) => {
+const SalesFunnelChart = ({ tenders, rollup }) => {
   const statusOrder = ['Round 1', 'Round 2', 'Round 3', 'Round 4', 'BAFO', 'Won', 'Lost'];
   const statusCounts = statusOrder.map(status => ({
     status,
-    count: tenders.filter(tender => tender.status === status).length,
-    value: tenders.filter(tender => tender.status === status)
-      .reduce((sum, tender) => sum + tender.deal_value, 0)
+    ...rollupEntry(rollup, tenders, 'status', status)
   }));
 
   const COLORS = {
@@ -674,8 +703,10 @@ const SalesFunnelChart = ({ tenders }) => {
 };
 
 // Deal Values by Customer Pie Chart
-const CustomerDealsPieChart = ({ tenders }) => {
-  const customerData = tenders.reduce((acc, tender) => {
+const CustomerDealsPieChart = ({ tenders, rollup }) => {
+  const customerData = rollup ? rollup.map(entry => ({
+    name: entry.value, value: entry.deal_value, count: entry.count
+  })) : tenders.reduce((acc, tender) => {
     if (!acc[tender.customer]) {
       acc[tender.customer] = { name: tender.customer, value: 0, count: 0 };
     }
@@ -766,13 +797,11 @@ const CustomerDealsPieChart = ({ tenders }) => {
 };
 
 // Priority Distribution Bar Chart
-const PriorityBarChart = ({ tenders }) => {
-  const priorityData = ['High', 'Medium', 'Low'].map(priority => ({
-    priority,
-    count: tenders.filter(tender => tender.priority === priority).length,
-    totalValue: tenders.filter(tender => tender.priority === priority)
-      .reduce((sum, tender) => sum + tender.deal_value, 0)
-  }));
+const PriorityBarChart = ({ tenders, rollup }) => {
+  const priorityData = ['High', 'Medium', 'Low'].map(priority => {
+    const { count, value } = rollupEntry(rollup, tenders, 'priority', priority);
+    return { priority, count, totalValue: value };
+  });
 
   const COLORS = {
     'High': '#EF4444',
@@ -998,25 +1027,72 @@ function App() {
   });
   const [customers, setCustomers] = useState([]);
   const [isExporting, setIsExporting] = useState(false);
+  const [importStatus, setImportStatus] = useState(null);
+  const [summary, setSummary] = useState(null);
 
   // Refs for PDF export
   const ganttRef = useRef(null);
   const chartsRef = useRef(null);
   const tableRef = useRef(null);
 
+  // Live tender deltas pushed by the backend; while connected we apply them
+  // instead of refetching the whole list after every change
+  const streamConnected = useRef(false);
+
   useEffect(() => {
     fetchTenders();
     fetchCustomers();
+
+    const events = new EventSource(`${API}/tenders/stream`);
+    const upsertTender = (event) => {
+      const { tender } = JSON.parse(event.data);
+      if (!tender) {
+        fetchTenders();
+        return;
+      }
+      setTenders(current => {
+        const index = current.findIndex(t => t.id === tender.id);
+        if (index === -1) return [...current, tender];
+        const next = [...current];
+        next[index] = tender;
+        return next;
+      });
+    };
+    events.onopen = () => { streamConnected.current = true; };
+    events.onerror = () => { streamConnected.current = false; };
+    events.addEventListener('insert', upsertTender);
+    events.addEventListener('update', upsertTender);
+    events.addEventListener('delete', (event) => {
+      const { id } = JSON.parse(event.data);
+      setTenders(current => current.filter(t => t.id !== id));
+    });
+    events.addEventListener('resync', () => fetchTenders());
+
+    return () => events.close();
   }, []);
 
   useEffect(() => {
     filterTenders();
   }, [tenders, filters]);
 
+  // The rollups only change with the tenders; unchanged ones come back as 304
+  useEffect(() => {
+    fetchSummary();
+  }, [tenders]);
+
   const fetchTenders = async () => {
     try {
-      const response = await axios.get(`${API}/tenders`);
-      setTenders(response.data);
+      // Follow the keyset cursor until the backend reports no further page
+      let allTenders = [];
+      let cursor = null;
+      do {
+        const response = await axios.get(`${API}/tenders`, {
+          params: cursor ? { cursor } : {}
+        });
+        allTenders = allTenders.concat(response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      setTenders(allTenders);
       setLoading(false);
     } catch (error) {
       console.error('Error fetching tenders:', error);
@@ -1033,6 +1109,15 @@ function App() {
     }
   };
 
+  const fetchSummary = async () => {
+    try {
+      const response = await axios.get(`${API}/analytics/summary`);
+      setSummary(response.data);
+    } catch (error) {
+      console.error('Error fetching analytics summary:', error);
+    }
+  };
+
   const filterTenders = () => {
     let filtered = tenders;
     
@@ -1052,15 +1137,29 @@ function App() {
   const handleSaveTender = async (formData) => {
     try {
       if (editingTender) {
-        await axios.put(`${API}/tenders/${editingTender.id}`, formData);
+        // Only the fields that changed are written; If-Match rejects the save
+        // when someone else updated the tender since it was opened
+        await axios.patch(`${API}/tenders/${editingTender.id}`, formData, {
+          headers: {
+            'Content-Type': 'application/merge-patch+json',
+            ...(editingTender.version !== undefined && { 'If-Match': `"${editingTender.version}"` })
+          }
+        });
       } else {
         await axios.post(`${API}/tenders`, formData);
       }
-      fetchTenders();
+      if (!streamConnected.current) fetchTenders();
       fetchCustomers();
       setShowForm(false);
       setEditingTender(null);
     } catch (error) {
+      if (error.response?.status === 409) {
+        alert('This tender was changed by someone else. Reload it and apply your changes again.');
+        fetchTenders();
+        setShowForm(false);
+        setEditingTender(null);
+        return;
+      }
       console.error('Error saving tender:', error);
     }
   };
@@ -1069,7 +1168,7 @@ function App() {
     if (window.confirm('Are you sure you want to delete this tender?')) {
       try {
         await axios.delete(`${API}/tenders/${tenderId}`);
-        fetchTenders();
+        if (!streamConnected.current) fetchTenders();
         fetchCustomers();
       } catch (error) {
         console.error('Error deleting tender:', error);
@@ -1082,10 +1181,54 @@ function App() {
     setShowForm(true);
   };
 
+  // The rollups cover every tender, so the charts use them only when unfiltered
+  const chartSummary = Object.values(filters).some(Boolean) ? null : summary;
+
   const clearFilters = () => {
     setFilters({ status: '', priority: '', customer: '' });
   };
 
+  // Server-side CSV/Excel export of every tender matching the active filters
+  const exportUrl = (format) => {
+    const params = new URLSearchParams({ format });
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value) params.append(key, value);
+    });
+    return `${API}/tenders/export?${params}`;
+  };
+
+  // Sheet import runs as a background job on the server; poll it until done
+  const importSheet = async (event) => {
+    const file = event.target.files[0];
+    event.target.value = '';
+    if (!file) return;
+    const format = file.name.toLowerCase().endsWith('.xlsx') ? 'xlsx' : 'csv';
+    try {
+      let { data: job } = await axios.post(`${API}/tenders/import`, file, {
+        params: { format },
+        headers: { 'Content-Type': 'application/octet-stream' }
+      });
+      while (job.status === 'queued' || job.status === 'running') {
+        setImportStatus(`Importing... ${job.rows} rows`);
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        ({ data: job } = await axios.get(`${API}/tenders/import/${job.id}`));
+      }
+      setImportStatus(null);
+      if (job.status === 'failed') {
+        alert(`Import failed: ${job.error}`);
+      } else {
+        const firstErrors = job.errors.slice(0, 5).map(e => `Row ${e.row}: ${e.error}`).join('\n');
+        alert(`Imported ${job.inserted} tenders, ${job.failed} rows rejected${firstErrors ? `\n\n${firstErrors}` : ''}`);
+      }
+      if (!streamConnected.current) fetchTenders();
+      fetchCustomers();
+    } catch (error) {
+      setImportStatus(null);
+      console.error('Error importing tenders:', error);
+      alert('Error importing tenders. Please try again.');
+    }
+  };
+
   // Enhanced PDF Export Functionality
   const exportToPDF = async () => {
     try {
@@ -1284,7 +1427,7 @@ function App() {
   return (
     <div className="min-h-screen bg-gray-900">
       {/* Live Countdown Panel */}
-      <LiveCountdownPanel tenders={filteredTenders} />
+      <LiveCountdownPanel tenders={tenders} filters={filters} />
       
       <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-8">
         {/* Header */}
@@ -1358,6 +1501,25 @@ function App() {
                   </>
                 )}
               </button>
+              {['csv', 'xlsx'].map(format => (
+                <a
+                  key={format}
+                  href={exportUrl(format)}
+                  className="bg-green-600 text-white px-4 py-2 rounded-md hover:bg-green-700 focus:outline-none focus:ring-2 focus:ring-green-500"
+                >
+                  {format === 'csv' ? 'Export CSV' : 'Export Excel'}
+                </a>
+              ))}
+              <label className="bg-green-600 text-white px-4 py-2 rounded-md hover:bg-green-700 cursor-pointer">
+                {importStatus || 'Import Sheet'}
+                <input
+                  type="file"
+                  accept=".csv,.xlsx"
+                  onChange={importSheet}
+                  disabled={importStatus !== null}
+                  className="hidden"
+                />
+              </label>
               <button
                 onClick={() => setShowForm(true)}
                 className="bg-blue-600 text-white px-4 py-2 rounded-md hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-blue-500"
@@ -1489,13 +1651,13 @@ function App() {
         {/* Charts Section - Moved to bottom */}
         <div className="grid grid-cols-1 lg:grid-cols-2 xl:grid-cols-3 gap-6 mb-6" ref={chartsRef}>
           <div className="lg:col-span-2 xl:col-span-1">
-            <SalesFunnelChart tenders={filteredTenders} />
+            <SalesFunnelChart tenders={filteredTenders} rollup={chartSummary?.status} />
           </div>
           <div>
-            <CustomerDealsPieChart tenders={filteredTenders} />
+            <CustomerDealsPieChart tenders={filteredTenders} rollup={chartSummary?.customer} />
           </div>
           <div>
-            <PriorityBarChart tenders={filteredTenders} />
+            <PriorityBarChart tenders={filteredTenders} rollup={chartSummary?.priority} />
           </div>
         </div>
 
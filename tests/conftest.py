@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Read when server is imported: the API runs on the embedded SQLite engine, so
+# the suite needs no database server. Each test gets its own data directory.
+os.environ.update(
+    STORAGE_BACKEND="embedded",
+    EMBEDDED_DATA_DIR=tempfile.mkdtemp(prefix="tenders-tests-"),
+    DB_NAME="tenders_test",
+)
+os.environ.pop("SHARED_TENDER_VERSION", None)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """A TestClient for the app, started on an empty embedded database."""
+    from fastapi.testclient import TestClient
+
+    import server
+
+    monkeypatch.setenv("EMBEDDED_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "test-admin-token")
+    with TestClient(server.app) as client:
+        yield client
+
+
+def make_tender(n: int = 0, **overrides) -> dict:
+    tender = {
+        "item": f"Item {n}",
+        "customer": f"Customer {n % 3}",
+        "tender_name": f"Tender {n}",
+        "start_date": f"2024-0{1 + n % 3}-05",
+        "expiry_date": "2024-06-30",
+        "due_date": "2024-06-01T10:00:00Z",
+        "deal_value": 100.0 + n,
+        "priority": "High" if n % 2 else "Low",
+        "assigned_sales_rep": f"Rep {n % 2}",
+    }
+    tender.update(overrides)
+    return tender
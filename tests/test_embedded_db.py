@@ -0,0 +1,260 @@
+"""The embedded SQLite engine against the Mongo semantics the routes rely on."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import TEXT, DeleteOne, IndexModel, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from embedded_db import EmbeddedClient
+from server import TENDER_SORT, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def db(tmp_path):
+    client = EmbeddedClient(tmp_path)
+    yield client["engine_test"]
+    client.close()
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def seed(collection, count: int = 6) -> list:
+    base = datetime(2024, 1, 1)
+    documents = [
+        {
+            "id": f"t{n}",
+            "customer": f"C{n % 3}",
+            "status": "Won" if n % 2 else "Offer",
+            "deal_value": float(n),
+            "created_at": base + timedelta(hours=n // 2),
+            "due_date": base + timedelta(days=n),
+        }
+        for n in range(count)
+    ]
+    await collection.insert_many([dict(document) for document in documents])
+    return documents
+
+
+def ids(documents) -> list:
+    return [document["id"] for document in documents]
+
+
+def test_filters(db):
+    async def scenario():
+        await seed(db.tenders)
+        await db.tenders.insert_one({"id": "legacy", "due_date": "2024-01-03T00:00:00"})
+
+        async def find(query):
+            return sorted(ids(await db.tenders.find(query).to_list(None)))
+
+        assert await find({"customer": "C1"}) == ["t1", "t4"]
+        assert await find({"customer": "C1", "status": "Won"}) == ["t1"]
+        window = {"$gt": datetime(2024, 1, 3), "$lte": datetime(2024, 1, 5)}
+        assert await find({"due_date": window}) == ["t3", "t4"]
+        # Aware bounds are compared in UTC
+        aware = datetime(2024, 1, 2, 1, tzinfo=timezone(timedelta(hours=2)))
+        assert await find({"due_date": {"$lt": aware}}) == ["t0"]
+        assert await find({"due_date": {"$gte": aware}}) == ["t1", "t2", "t3", "t4", "t5"]
+        assert await find({"status": {"$in": ["Won", "Lost"]}}) == ["t1", "t3", "t5"]
+        assert await find({"status": {"$in": [None]}}) == ["legacy"]
+        assert await find({"status": None}) == ["legacy"]
+        assert await find({"customer": {"$exists": False}}) == ["legacy"]
+        assert await find({"due_date": {"$type": "string"}}) == ["legacy"]
+        assert len(await find({"due_date": {"$type": "date"}})) == 6
+        assert await find({"$or": [{"customer": "C2"}, {"id": "t0"}]}) == ["t0", "t2", "t5"]
+        assert await db.tenders.count_documents({"status": "Offer"}) == 3
+        assert sorted(await db.tenders.distinct("customer")) == ["C0", "C1", "C2"]
+        with pytest.raises(NotImplementedError):
+            await db.tenders.find({"customer": {"$regex": "^C"}}).to_list(None)
+
+    run(scenario())
+
+
+def test_dates_come_back_as_naive_utc(db):
+    async def scenario():
+        aware = datetime(2030, 1, 1, 10, 0, 0, 123456, tzinfo=timezone(timedelta(hours=2)))
+        await db.tenders.insert_one({"id": "t", "due_date": aware})
+        stored = await db.tenders.find_one({"id": "t"})
+        # Millisecond precision, like BSON
+        assert stored["due_date"] == datetime(2030, 1, 1, 8, 0, 0, 123000)
+
+    run(scenario())
+
+
+def test_keyset_paging(db):
+    async def scenario():
+        documents = await seed(db.tenders, 11)
+        documents.sort(key=lambda document: (document["created_at"], document["id"]))
+        seen, query = [], {}
+        while True:
+            page = await db.tenders.find(query).sort(TENDER_SORT).limit(4).to_list(4)
+            if not page:
+                break
+            seen.extend(ids(page))
+            query = decode_cursor(encode_cursor(page[-1]))
+        assert seen == ids(documents)
+
+        cursor = db.tenders.find({}, {"id": 1, "_id": 0}).sort("due_date", -1).limit(2)
+        newest = await cursor.to_list(None)
+        assert newest == [{"id": "t10"}, {"id": "t9"}]
+        first = await db.tenders.find_one({"status": "Won"}, sort=[("due_date", 1)])
+        assert first["id"] == "t1"
+
+    run(scenario())
+
+
+def test_updates(db):
+    async def scenario():
+        await seed(db.tenders, 2)
+        update = {"$set": {"status": "Lost"}, "$inc": {"version": 1}}
+        result = await db.tenders.update_one({"id": "t0"}, update)
+        assert (result.matched_count, result.modified_count) == (1, 1)
+        await db.tenders.update_one({"id": "t0"}, {"$inc": {"version": 2, "deal_value": 0.5}})
+        projection = {"_id": 0, "status": 1, "version": 1, "deal_value": 1}
+        stored = await db.tenders.find_one({"id": "t0"}, projection)
+        assert stored == {"status": "Lost", "version": 3, "deal_value": 0.5}
+
+        missing = await db.tenders.update_one({"id": "none"}, {"$set": {"status": "Won"}})
+        assert (missing.matched_count, missing.upserted_id) == (0, None)
+        upsert = {"$inc": {"count": 1}, "$setOnInsert": {"key": "c9"}}
+        query = {"dimension": "customer", "value": "C9"}
+        for _ in range(2):
+            await db.dimensions.update_one(query, upsert, upsert=True)
+        entry = await db.dimensions.find_one({"value": "C9"}, {"_id": 0})
+        assert entry == {"dimension": "customer", "value": "C9", "count": 2, "key": "c9"}
+
+        with pytest.raises(NotImplementedError):
+            await db.tenders.update_one({"id": "t0"}, {"$push": {"tags": "x"}})
+
+    run(scenario())
+
+
+def test_find_one_and_update(db):
+    async def scenario():
+        await seed(db.tenders, 2)
+        before = await db.tenders.find_one_and_update({"id": "t0"}, {"$inc": {"version": 1}})
+        assert "version" not in before
+        after = await db.tenders.find_one_and_update(
+            {"id": "t0", "version": 1}, {"$inc": {"version": 1}}, {"version": 1, "_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        assert after == {"version": 2}
+        # A stale compare-and-set matches nothing and writes nothing
+        stale = {"id": "t0", "version": 1}
+        assert await db.tenders.find_one_and_update(stale, {"$inc": {"version": 1}}) is None
+        assert (await db.tenders.find_one({"id": "t0"}))["version"] == 2
+
+        counter = await db.counters.find_one_and_update(
+            {"_id": "tenders"}, {"$inc": {"value": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        assert counter == {"_id": "tenders", "value": 1}
+
+        deleted = await db.tenders.find_one_and_delete({"id": "t1"})
+        assert deleted["id"] == "t1" and await db.tenders.find_one({"id": "t1"}) is None
+
+    run(scenario())
+
+
+def test_bulk_write(db):
+    async def scenario():
+        await db.tenders.create_indexes([IndexModel([("id", 1)], unique=True, name="id_unique")])
+        await seed(db.tenders, 2)
+        with pytest.raises(BulkWriteError) as error:
+            await db.tenders.bulk_write([
+                InsertOne({"id": "t0"}),
+                InsertOne({"id": "t9"}),
+                UpdateOne({"id": "t1"}, {"$set": {"status": "Lost"}}),
+                DeleteOne({"id": "t0"}),
+            ], ordered=False)
+        details = error.value.details
+        assert [e["index"] for e in details["writeErrors"]] == [0]
+        assert (details["nInserted"], details["nModified"], details["nRemoved"]) == (1, 1, 1)
+        assert sorted(ids(await db.tenders.find({}).to_list(None))) == ["t1", "t9"]
+        with pytest.raises(DuplicateKeyError):
+            await db.tenders.insert_one({"id": "t9"})
+
+    run(scenario())
+
+
+def test_aggregation(db):
+    async def scenario():
+        await seed(db.tenders)
+        pipeline = [
+            {"$match": {"status": "Won"}},
+            {"$group": {
+                "_id": "$customer",
+                "count": {"$sum": 1},
+                "total": {"$sum": "$deal_value"},
+                "avg": {"$avg": "$deal_value"},
+                "min": {"$min": "$deal_value"},
+                "max": {"$max": "$due_date"},
+            }},
+        ]
+        groups = {group.pop("_id"): group async for group in db.tenders.aggregate(pipeline)}
+        assert groups == {
+            "C0": {"count": 1, "total": 3.0, "avg": 3.0, "min": 3.0, "max": datetime(2024, 1, 4)},
+            "C1": {"count": 1, "total": 1.0, "avg": 1.0, "min": 1.0, "max": datetime(2024, 1, 2)},
+            "C2": {"count": 1, "total": 5.0, "avg": 5.0, "min": 5.0, "max": datetime(2024, 1, 6)},
+        }
+
+        key = {"customer": "$customer", "status": "$status"}
+        compound = [{"$group": {"_id": key, "count": {"$sum": 1}}}]
+        pairs = {
+            (group["_id"]["customer"], group["_id"]["status"]): group["count"]
+            async for group in db.tenders.aggregate(compound)
+        }
+        assert pairs == {(f"C{n % 3}", "Won" if n % 2 else "Offer"): 1 for n in range(6)}
+
+        # Legacy string dates are converted; unparseable ones group under None
+        await db.tenders.insert_many([
+            {"id": "legacy", "due_date": "2024-02-10"},
+            {"id": "bad", "due_date": "soon"},
+        ])
+        converted = {"$convert": {"input": "$due_date", "to": "date", "onError": None}}
+        month = {"$dateToString": {"format": "%Y-%m", "date": converted}}
+        by_month = [{"$group": {"_id": month, "count": {"$sum": 1}}}]
+        months = {group["_id"]: group["count"] async for group in db.tenders.aggregate(by_month)}
+        assert months == {"2024-01": 6, "2024-02": 1, None: 1}
+
+        with pytest.raises(NotImplementedError):
+            await db.tenders.aggregate(pipeline + [{"$sort": {"count": -1}}]).to_list(None)
+
+    run(scenario())
+
+
+def test_text_search(db):
+    async def scenario():
+        await db.tenders.create_indexes([IndexModel(
+            [("tender_name", TEXT), ("customer", TEXT)],
+            weights={"tender_name": 3, "customer": 1},
+            name="tender_text",
+        )])
+        await db.tenders.insert_many([
+            {"id": "a", "tender_name": "Solar panels", "customer": "Acme"},
+            {"id": "b", "tender_name": "Wind farm", "customer": "Solar Corp"},
+            {"id": "c", "tender_name": "Cables", "customer": "Acme"},
+        ])
+
+        async def search(terms, **query):
+            projection = {"_id": 0, "id": 1, "score": {"$meta": "textScore"}}
+            cursor = db.tenders.find({"$text": {"$search": terms}, **query}, projection)
+            return ids(await cursor.sort([("score", {"$meta": "textScore"})]).to_list(None))
+
+        # Any term matches; the heavier tender_name field ranks first
+        assert await search("solar") == ["a", "b"]
+        assert sorted(await search("cables wind")) == ["b", "c"]
+        # Negated terms are ignored rather than excluded
+        assert sorted(await search("acme -solar")) == ["a", "c"]
+        assert await search("solar", customer="Acme") == ["a"]
+        assert await search("-solar") == []
+
+        # The index follows updates and deletes
+        await db.tenders.update_one({"id": "c"}, {"$set": {"tender_name": "Solar cables"}})
+        await db.tenders.find_one_and_delete({"id": "a"})
+        assert await search("solar") == ["c", "b"]
+
+    run(scenario())
@@ -0,0 +1,151 @@
+"""The tender routes end to end, through the app on the embedded engine."""
+import pytest
+
+import server
+
+from .conftest import make_tender
+
+MERGE_PATCH = {"Content-Type": "application/merge-patch+json"}
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+def create(api, n: int = 0, **overrides) -> dict:
+    response = api.post("/api/tenders", json=make_tender(n, **overrides))
+    assert response.status_code == 200
+    return response.json()
+
+
+def summary(api) -> dict:
+    body = api.get("/api/analytics/summary").json()
+    return {dimension: body[dimension] for dimension in server.DIMENSIONS}
+
+
+def test_detail_etag_and_if_match(api):
+    tender = create(api)
+    url = f"/api/tenders/{tender['id']}"
+
+    detail = api.get(url)
+    assert detail.headers["ETag"] == '"1"'
+    assert api.get(url, headers={"If-None-Match": '"1"'}).status_code == 304
+
+    updated = api.put(url, json={"status": "Round 1"}, headers={"If-Match": '"1"'})
+    assert updated.status_code == 200
+    assert updated.headers["ETag"] == '"2"' and updated.json()["version"] == 2
+    assert api.get(url).headers["ETag"] == '"2"'
+    assert api.get(url, headers={"If-None-Match": '"1"'}).status_code == 200
+
+    # A writer still holding version 1 is told the current one and nothing is written
+    stale = api.put(url, json={"status": "Lost"}, headers={"If-Match": '"1"'})
+    assert stale.status_code == 409
+    assert stale.headers["ETag"] == '"2"'
+    assert api.get(url).json()["status"] == "Round 1"
+
+    # Weak validators from intermediaries carry the same version
+    weak = api.put(url, json={"status": "Round 2"}, headers={"If-Match": 'W/"2"'})
+    assert weak.status_code == 200 and weak.headers["ETag"] == '"3"'
+    assert api.put(url, json={"status": "BAFO"}, headers={"If-Match": "*"}).status_code == 200
+
+
+@pytest.mark.parametrize("if_match", ['"abc"', "1.5", 'W/"x"'])
+def test_malformed_if_match(api, if_match):
+    tender = create(api)
+    url = f"/api/tenders/{tender['id']}"
+    assert api.put(url, json={"status": "Won"}, headers={"If-Match": if_match}).status_code == 400
+    patch = api.patch(url, json={"status": "Won"}, headers={**MERGE_PATCH, "If-Match": if_match})
+    assert patch.status_code == 400
+    assert api.get(url).json()["version"] == 1
+
+
+def test_patch_writes_only_changed_fields(api, monkeypatch):
+    tender = create(api)
+    url = f"/api/tenders/{tender['id']}"
+    writes = []
+    apply_tender_update = server.apply_tender_update
+
+    async def recording(tender_id, update_data, version=None):
+        writes.append(set(update_data))
+        return await apply_tender_update(tender_id, update_data, version)
+
+    monkeypatch.setattr(server, "apply_tender_update", recording)
+
+    patch = {"customer": tender["customer"], "priority": "Medium",
+             "deal_value": tender["deal_value"]}
+    response = api.patch(url, json=patch, headers={**MERGE_PATCH, "If-Match": '"1"'})
+    assert response.status_code == 200
+    assert writes == [{"priority", "updated_at"}]
+    assert response.headers["ETag"] == '"2"'
+    assert response.json()["priority"] == "Medium"
+
+    # Nothing differs: no write, no new version
+    unchanged = api.patch(url, json={"priority": "Medium"}, headers=MERGE_PATCH)
+    assert unchanged.status_code == 200 and unchanged.headers["ETag"] == '"2"'
+    assert len(writes) == 1
+
+    stale = api.patch(url, json={"priority": "Low"}, headers={**MERGE_PATCH, "If-Match": '"1"'})
+    assert stale.status_code == 409 and len(writes) == 1
+    assert api.patch(url, json={"customer": None}, headers=MERGE_PATCH).status_code == 422
+
+
+def test_list_etag(api):
+    create(api)
+    listing = api.get("/api/tenders")
+    etag = listing.headers["ETag"]
+    assert listing.headers["Vary"] == "Accept"
+    assert api.get("/api/tenders", headers={"If-None-Match": etag}).status_code == 304
+
+    create(api, 1)
+    assert api.get("/api/tenders", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_cursor_paging(api):
+    created = [create(api, n) for n in range(7)]
+    created.sort(key=lambda tender: (tender["created_at"], tender["id"]))
+    expected = [tender["id"] for tender in created]
+    # Without limit or cursor the whole list comes back, in the same order
+    assert [tender["id"] for tender in api.get("/api/tenders").json()] == expected
+
+    seen, params = [], {"limit": 3}
+    while True:
+        page = api.get("/api/tenders", params=params)
+        assert page.status_code == 200
+        seen.extend(tender["id"] for tender in page.json())
+        if "X-Next-Cursor" not in page.headers:
+            break
+        params = {"limit": 3, "cursor": page.headers["X-Next-Cursor"]}
+    assert seen == expected
+
+    seen, params = [], {"limit": 4, "envelope": "true", "fields": "customer"}
+    while True:
+        body = api.get("/api/tenders", params=params).json()
+        assert all(set(tender) == {"id", "customer"} for tender in body["tenders"])
+        seen.extend(tender["id"] for tender in body["tenders"])
+        if body["next_cursor"] is None:
+            break
+        params = {**params, "cursor": body["next_cursor"]}
+    assert seen == expected
+
+    assert api.get("/api/tenders", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_dimension_deltas_match_a_rebuild(api):
+    first = create(api, 0, deal_value=100.5)
+    second = create(api, 1, deal_value=20.25)
+    create(api, 2, customer=first["customer"])
+    api.put(f"/api/tenders/{first['id']}", json={"customer": "New Customer", "status": "Won"})
+    api.patch(f"/api/tenders/{second['id']}", json={"deal_value": 40.0, "start_date": "2024-09-01"},
+              headers=MERGE_PATCH)
+    api.delete(f"/api/tenders/{second['id']}")
+
+    incremental = summary(api)
+    statuses = {entry["value"]: entry["count"] for entry in incremental["status"]}
+    assert statuses == {"Offer": 1, "Won": 1}
+    customers = {entry["value"]: entry["deal_value"] for entry in incremental["customer"]}
+    assert customers == {"New Customer": 100.5, first["customer"]: 102.0}
+    # The deleted tender's values are gone rather than left at zero
+    assert all(entry["count"] > 0 for entries in incremental.values() for entry in entries)
+    assert "2024-09" not in {entry["value"] for entry in incremental["month"]}
+
+    assert api.post("/api/admin/dimensions/rebuild", headers=ADMIN).status_code == 200
+    assert summary(api) == incremental
+    filters = api.get("/api/tenders/filters/customers").json()
+    assert filters["customers"] == sorted(customers)